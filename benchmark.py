@@ -0,0 +1,229 @@
+"""
+    Pipeline Benchmarks
+
+    python benchmark.py                          run every stage on synthetic input
+    python benchmark.py --recording _out/rec     map stage on a recorded map (needs carla)
+    python benchmark.py --save-baseline FILE     store the results
+    python benchmark.py --baseline FILE          exit 1 when a stage got slower than FILE allows
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+import tracemalloc
+from time import perf_counter
+from types import SimpleNamespace
+import numpy as np
+from loguru import logger
+
+from scenarios.map_geometry import MapGeometry
+from scenarios.map_export import GeoJsonWriter
+from scenarios.actor_geometry import ActorBatch, footprints
+from scenarios.xviz_pipeline import ActorState, FrameSnapshot
+
+OUTPUT_FILE = 'bench_output.txt'
+
+
+class SyntheticWaypoint:
+    """
+        Minimal carla.Waypoint stand-in: lanes along gentle arcs, `length`
+        meters per road, roads chained one after another.
+    """
+    __slots__ = ('road_id', 'section_id', 'lane_id', 's', 'lane_width', '_map')
+
+    def __init__(self, synthetic_map, road_id, lane_id, s) -> None:
+        self.road_id = road_id
+        self.section_id = 0
+        self.lane_id = lane_id
+        self.s = s
+        self.lane_width = 3.5
+        self._map = synthetic_map
+
+    @property
+    def transform(self):
+        origin = self.road_id * 500.0
+        heading = 0.002 * self.s
+        location = SimpleNamespace(x=origin + 500.0 * math.sin(heading),
+                                   y=self.lane_id * 3.5 + 500.0 * (1.0 - math.cos(heading)),
+                                   z=0.0)
+        rotation = SimpleNamespace(pitch=0.0, yaw=math.degrees(heading), roll=0.0)
+        return SimpleNamespace(location=location, rotation=rotation)
+
+    def next(self, distance):
+        s = self.s + distance
+        if s < self._map.length:
+            return [SyntheticWaypoint(self._map, self.road_id, self.lane_id, s)]
+        if self.road_id + 1 < self._map.roads:
+            return [SyntheticWaypoint(self._map, self.road_id + 1, self.lane_id, 0.0)]
+        return []
+
+
+class SyntheticMap:
+    def __init__(self, roads=40, lanes=4, length=200.0) -> None:
+        self.name = 'Synthetic'
+        self.roads = roads
+        self.lanes = lanes
+        self.length = length
+
+    def get_topology(self):
+        topology = []
+        for road in range(self.roads - 1):
+            for lane in range(1, self.lanes + 1):
+                topology.append((SyntheticWaypoint(self, road, lane, 0.0),
+                                 SyntheticWaypoint(self, road + 1, lane, 0.0)))
+        return topology
+
+
+def synthetic_actors(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [ActorState(i,
+                       tuple(rng.uniform(-500, 500, 3)),
+                       (0.0, 0.0, float(rng.uniform(-180, 180))),
+                       (0.0, 0.0, 0.7),
+                       (2.3, 1.0, 0.7)) for i in range(count)]
+
+
+def synthetic_snapshot(frame, actors):
+    return FrameSnapshot(frame, frame * 0.05, actors[0], 10.0, 0.5,
+                         ActorBatch.from_states(actors[1:]), ActorBatch.from_states([]))
+
+
+def bench_map_geometry(c_map):
+    segments = MapGeometry(c_map).segments
+    return sum(len(s.points) for s in segments), 'points'
+
+
+def bench_map_export(c_map, path):
+    with GeoJsonWriter(path, decimals=3) as writer:
+        writer.write_segments(MapGeometry(c_map).iter_segments())
+    return writer.count, 'features'
+
+
+def bench_image_decode(frames=200, width=1280, height=720):
+    from scenarios.image_decoder import ImageDecoder
+
+    raw = np.random.default_rng(0).integers(0, 255, width * height * 4, dtype=np.uint8).tobytes()
+    images = [SimpleNamespace(frame=i, width=width, height=height, raw_data=raw) for i in range(frames)]
+    decoder = ImageDecoder()
+    try:
+        for future in [decoder.submit(0, image) for image in images]:
+            future.result().release()
+    finally:
+        decoder.close()
+    return frames, 'frames'
+
+
+def bench_footprints(actors, repeat=200):
+    batch = ActorBatch.from_states(actors)
+    for _ in range(repeat):
+        footprints(batch)
+    return repeat * len(actors), 'polygons'
+
+
+def bench_xviz_writer(kind, actors, directory, frames=100):
+    from xviz_avs.io import XVIZGLBWriter, XVIZJsonWriter, DirectorySource
+    from scenarios.carla_xviz import CarlaXviz
+
+    xviz = CarlaXviz()
+    writer = (XVIZGLBWriter if kind == 'glb' else XVIZJsonWriter)(DirectorySource(directory))
+    writer.write_message(xviz.get_metabuilder().get_message())
+    for frame in range(frames):
+        writer.write_message(xviz.get_frame_message(synthetic_snapshot(frame, actors)))
+    writer.close()
+    return frames, 'frames'
+
+
+def run_stage(name, fn, *args, memory=True):
+    start = perf_counter()
+    count, unit = fn(*args)
+    elapsed = perf_counter() - start
+
+    # tracemalloc slows allocations down a lot, so peak memory gets its own run
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    result = {
+        'seconds': elapsed,
+        'throughput': count / elapsed if elapsed else 0.0,
+        'unit': unit + '/s',
+        'peak_mb': peak / 1e6,
+    }
+    logger.info('{:<16} {:>12.1f} {:<12} {:>8.3f} s {:>8.1f} MB peak'.format(
+        name, result['throughput'], result['unit'], elapsed, result['peak_mb']))
+    return result
+
+
+def recorded_map(path):
+    from scenarios.replay import ReplayWorld
+    return ReplayWorld(path, speed=0).get_map()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='carla_xviz pipeline benchmarks')
+    parser.add_argument('--recording', help='recording directory to take the map from')
+    parser.add_argument('--actors', type=int, default=300)
+    parser.add_argument('--stages', nargs='*', help='subset of stages to run')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory runs')
+    parser.add_argument('--save-baseline', help='write results to this json file')
+    parser.add_argument('--baseline', help='compare against this json file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed throughput loss against the baseline')
+    args = parser.parse_args()
+
+    c_map = recorded_map(args.recording) if args.recording else SyntheticMap()
+    actors = synthetic_actors(args.actors)
+    tmp = tempfile.mkdtemp(prefix='carla_xviz_bench_')
+
+    stages = {
+        'map_geometry': (bench_map_geometry, c_map),
+        'map_export': (bench_map_export, c_map, os.path.join(tmp, 'map.json')),
+        'image_decode': (bench_image_decode,),
+        'footprints': (bench_footprints, actors),
+        'xviz_glb': (bench_xviz_writer, 'glb', actors, os.path.join(tmp, 'glb')),
+        'xviz_json': (bench_xviz_writer, 'json', actors, os.path.join(tmp, 'json')),
+    }
+    for directory in ('glb', 'json'):
+        os.makedirs(os.path.join(tmp, directory))
+
+    results = {}
+    for name, (fn, *fn_args) in stages.items():
+        if args.stages and name not in args.stages:
+            continue
+        try:
+            results[name] = run_stage(name, fn, *fn_args, memory=not args.no_memory)
+        except ImportError as e:
+            logger.info('{:<16} skipped : {}'.format(name, e))
+
+    with open(OUTPUT_FILE, 'w') as fout:
+        json.dump(results, fout, indent=2)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as fout:
+            json.dump(results, fout, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)
+
+        slower = []
+        for name, result in results.items():
+            reference = baseline.get(name)
+            if reference and result['throughput'] < reference['throughput'] * (1.0 - args.tolerance):
+                slower.append('{} {:.1f} < {:.1f} {}'.format(
+                    name, result['throughput'], reference['throughput'], result['unit']))
+
+        if slower:
+            for line in slower:
+                logger.info('regression : {}'.format(line))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
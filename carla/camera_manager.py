@@ -1,78 +1,222 @@
+import os
+import queue
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
 import carla
-from carla import ColorConverter as cc
+import cv2
+import numpy as np
 from loguru import logger
 from time import sleep
 
-class CameraManager(object):
-
-    def __init__(self, parent_actor):
+CODECS = {
+    'jpg': [cv2.IMWRITE_JPEG_QUALITY, 90],
+    'png': [cv2.IMWRITE_PNG_COMPRESSION, 3],
+}
+
+
+class CameraSpec(object):
+    """
+        One camera per tagged vehicle. transform is relative to the vehicle,
+        None puts it on a spring arm behind and above the bounding box.
+    """
+    __slots__ = ('name', 'width', 'height', 'fps', 'fov', 'transform')
+
+    def __init__(self, name, width=1280, height=720, fps=20.0, fov=110.0, transform=None):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fov = fov
+        self.transform = transform
+
+
+class FrameSlab(object):
+    """
+        `slots` BGRA frames of one camera preallocated in shared memory.
+        A slot is taken by the sensor callback and given back once a pool
+        worker wrote it out; with no free slot the frame is dropped.
+    """
+    def __init__(self, width, height, slots=8):
+        self.shape = (height, width, 4)
+        self.frame_bytes = height * width * 4
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.frame_bytes)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self._free = queue.SimpleQueue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    def acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def close(self):
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+
+# per worker process {shared memory name: SharedMemory}
+_attached = {}
+
+
+def _write_frame(slab_name, slot, shape, path, params):
+    shm = _attached.get(slab_name)
+    if shm is None:
+        shm = _attached[slab_name] = shared_memory.SharedMemory(name=slab_name)
+    frame_bytes = shape[0] * shape[1] * shape[2]
+    bgra = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * frame_bytes)
+    if not cv2.imwrite(path, cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR), params):
+        raise RuntimeError('cv2.imwrite failed for {}'.format(path))
+
+
+def _started():
+    return os.getpid()
+
+
+class Camera(object):
+    __slots__ = ('spec', 'parent', 'sensor', 'slab', 'directory', 'frames', 'dropped', 'errors')
+
+    def __init__(self, spec, parent, slab, directory):
+        self.spec = spec
+        self.parent = parent
         self.sensor = None
-        self._parent = parent_actor
+        self.slab = slab
+        self.directory = directory
+        self.frames = 0
+        self.dropped = 0
+        self.errors = 0
 
-        bound_x = 0.5 + self._parent.bounding_box.extent.x
-        bound_y = 0.5 + self._parent.bounding_box.extent.y
-        bound_z = 0.5 + self._parent.bounding_box.extent.z
 
-        self._camera_transform = carla.Transform(
+class CameraManager(object):
+    """
+        Attaches every CameraSpec to every vehicle whose role_name is in
+        `role_names` and records the images to
+        {output_dir}/{vehicle id}_{camera name}/{frame:08d}.{codec}.
+
+        Sensor callbacks only copy raw_data into a FrameSlab slot, BGRA->BGR
+        conversion and encoding run on a process pool, so many cameras are
+        neither held up by the GIL nor buffered without bound.
+    """
+    def __init__(self, world, output_dir, specs, role_names=('ego_vehicle',), slots=8, workers=None,
+                 codec='jpg'):
+        self._world = world
+        self._output_dir = output_dir
+        self._specs = specs
+        self._role_names = set(role_names)
+        self._slots = slots
+        self._codec = codec
+        self._params = CODECS[codec]
+        self._lock = threading.Lock()
+        self._workers = workers or os.cpu_count()
+        # spawn, so workers do not inherit the carla client threads
+        self._pool = ProcessPoolExecutor(max_workers=self._workers, mp_context=mp.get_context('spawn'))
+        self.cameras = []
+
+    def attach(self):
+        # bring the workers up before the first frame instead of dropping frames meanwhile
+        wait([self._pool.submit(_started) for _ in range(self._workers)])
+
+        bp_library = self._world.get_blueprint_library()
+        parents = [actor for actor in self._world.get_actors().filter('vehicle.*')
+                   if actor.attributes.get('role_name') in self._role_names]
+
+        for parent in parents:
+            for spec in self._specs:
+                directory = os.path.join(self._output_dir, '{}_{}'.format(parent.id, spec.name))
+                os.makedirs(directory, exist_ok=True)
+                camera = Camera(spec, parent, FrameSlab(spec.width, spec.height, self._slots), directory)
+                camera.sensor = self._world.spawn_actor(self._blueprint(bp_library, spec),
+                                                        self._transform(parent, spec),
+                                                        attach_to=parent,
+                                                        attachment_type=carla.AttachmentType.SpringArm
+                                                        if spec.transform is None else carla.AttachmentType.Rigid)
+                camera.sensor.listen(lambda image, camera=camera: self._on_image(camera, image))
+                self.cameras.append(camera)
+                logger.info('camera {} on {} : {}x{} @ {} fps'.format(
+                    spec.name, parent.id, spec.width, spec.height, spec.fps))
+
+        return self.cameras
+
+    def _blueprint(self, bp_library, spec):
+        bp = bp_library.find('sensor.camera.rgb')
+        bp.set_attribute('image_size_x', str(spec.width))
+        bp.set_attribute('image_size_y', str(spec.height))
+        bp.set_attribute('fov', str(spec.fov))
+        bp.set_attribute('sensor_tick', str(1.0 / spec.fps if spec.fps else 0.0))
+        bp.set_attribute('role_name', 'record_camera')
+        bp.set_attribute('gamma', '2.2')
+        return bp
+
+    @staticmethod
+    def _transform(parent, spec):
+        if spec.transform is not None:
+            return spec.transform
+
+        bound_x = 0.5 + parent.bounding_box.extent.x
+        bound_y = 0.5 + parent.bounding_box.extent.y
+        bound_z = 0.5 + parent.bounding_box.extent.z
+        return carla.Transform(
             carla.Location(x=-1.5*bound_x, y=+0.0*bound_y, z=1.5*bound_z),
             carla.Rotation(pitch=8.0)
         )
 
-        Attachment = carla.AttachmentType
-        self._camera_attach = Attachment.SpringArm
-
-        world = self._parent.get_world()
-        bp_library = world.get_blueprint_library()
-
-        self.bp = bp_library.find('sensor.camera.rgb')
-        self.bp.set_attribute('image_size_x', '1280')
-        self.bp.set_attribute('image_size_y', '720')
-        self.bp.set_attribute('fov', '110')
-        self.bp.set_attribute('role_name', 'record_camera')
-        self.bp.set_attribute('gamma', '2.2')
-
-    def set_camera(self):
-        if self.sensor is not None:
-            self.sensor.destroy()
-
-        self.sensor = self._parent.get_world().spawn_actor(
-            self.bp,
-            self._camera_transform,
-            attach_to=self._parent,
-            attachment_type=self._camera_attach
-        )
-
-        return self.sensor
+    def _on_image(self, camera, image):
+        slot = camera.slab.acquire()
+        if slot is None:
+            camera.dropped += 1
+            return
+
+        camera.slab.frames[slot] = np.frombuffer(image.raw_data, dtype=np.uint8).reshape(camera.slab.shape)
+        path = os.path.join(camera.directory, '{:08d}.{}'.format(image.frame, self._codec))
+        future = self._pool.submit(_write_frame, camera.slab.shm.name, slot, camera.slab.shape, path, self._params)
+        future.add_done_callback(lambda f: self._on_written(camera, slot, f))
+
+    def _on_written(self, camera, slot, future):
+        camera.slab.release(slot)
+        with self._lock:
+            if future.exception() is None:
+                camera.frames += 1
+            else:
+                camera.errors += 1
+                logger.info('camera {} write failed : {}'.format(camera.spec.name, future.exception()))
+
+    def stats(self):
+        return {'{}_{}'.format(c.parent.id, c.spec.name): {'frames': c.frames,
+                                                         'dropped': c.dropped,
+                                                         'errors': c.errors}
+                for c in self.cameras}
+
+    def close(self):
+        for camera in self.cameras:
+            camera.sensor.stop()
+            camera.sensor.destroy()
+        self._pool.shutdown()
+        for camera in self.cameras:
+            camera.slab.close()
+        logger.info('cameras closed {}'.format(self.stats()))
 
-def sensor_callback(sensor_data):
-    # p = Process(target=save_to_disk, args=(sensor_data, task_id, ))
-    # p.start()
-    # logger.info('{} : {}'.format(sensor_data.width, sensor_data.height))
-    queue.append(sensor_data)
-    # pass
 
 if __name__ == '__main__':
-    queue = []
-
     logger.info("carla image Recode")
     client = carla.Client('localhost', 2000)
+    client.set_timeout(10.0)
     world = client.get_world()
 
-    world_snapshots = world.wait_for_tick(seconds = 30)
-    sensor = None
-    for world_snapshot in world_snapshots:
-        id = world_snapshot.id
-        actor = world.get_actor(id)
-        if (actor.attributes.get('role_name') == 'ego_vehicle'):
-            ego_actor = actor
-            
-            # logger.info(ego_actor)
-            cm = CameraManager(ego_actor)
-            sensor = cm.set_camera()
-            sensor.listen(lambda data: sensor_callback(data))
-    
+    specs = [
+        CameraSpec('chase'),
+        CameraSpec('front', width=1920, height=1080, fps=10.0, fov=90.0,
+                   transform=carla.Transform(carla.Location(x=1.5, z=1.6))),
+    ]
+    cm = CameraManager(world, './_out/cameras/', specs, role_names=('ego_vehicle', 'hero'))
+    cm.attach()
 
     sleep(10)
 
-    sensor.stop()
-    logger.info("queue size {}".format(len(queue)))
\ No newline at end of file
+    cm.close()
@@ -1,31 +1,76 @@
 import os
-import json
 import threading
 from loguru import logger
 import signal
 from scenarios.carla_scenarios import CarlaScenario
+from scenarios.tick_driver import SyncTickDriver
+from scenarios.point_cloud import PointCloudFilter
+from scenarios.metrics import MetricsServer, metrics
+from scenarios.replay import ReplayClient, ReplayFinished
+from scenarios.connection import ConnectionSupervisor
+from scenarios.xviz_server import XVIZStreamServer
+from scenarios.map_export import LOD_TOLERANCES, lod_path, export_current, write_export_params
+from scenarios.map_tiles import INDEX_FILE
 
 from xviz_avs.io import XVIZGLBWriter, DirectorySource, XVIZJsonWriter
 
-scenario = CarlaScenario()
-
 OUTPUT_DIR = './_out/'    
+CACHE_DIR = OUTPUT_DIR + 'cache/'
+MAP_DECIMALS = 3
+MAP_TOLERANCE = 0.02    # Douglas-Peucker tolerance of map.json in meters, None keeps every vertex
+MAP_LODS = True         # also write map.lod{n}.json at LOD_TOLERANCES
+MAP_TILE_SIZE = 200.0   # meters per tile under _out/tiles/, None to skip tiling
+RECORD_IMAGES = False
+RECORD_CODEC = 'jpg'
+SYNC_MODE = False
+SYNC_DELTA = 0.05
+PIPELINE_DEPTH = 2
+METRICS_PORT = 9108
+RECORD_SESSION = None   # directory to record the session into
+REPLAY_SESSION = None   # directory of a recording to replay instead of a live server
+REPLAY_SPEED = 1.0
+PLOT_TELEMETRY = False  # plot ego speed/acceleration and IMU in a separate process
+LIVE_PORT = 3000        # websocket port for live streetscape.gl viewers, None to disable
 
-def signal_handler(signum, stop):
+def shutdown(scenario, tick_driver, live_server):
+    if tick_driver is not None:
+        tick_driver.restore()
     scenario.clear()
-    logger.info("User ctrl+c exit.")
-    os.kill(os.getpid(), signal.SIGKILL)
+    if live_server is not None:
+        live_server.close()
 
 def main():
+    # built here and not at import, see scenarios.process_pool.spawn_pool
+    scenario = CarlaScenario(map_cache_dir=CACHE_DIR,
+                             lidar_filter=PointCloudFilter(max_range=60.0, z_range=(-3.0, 5.0), voxel_size=0.2),
+                             client=ReplayClient(REPLAY_SESSION, speed=REPLAY_SPEED) if REPLAY_SESSION else None)
+    tick_driver = SyncTickDriver(scenario, fixed_delta=SYNC_DELTA, depth=PIPELINE_DEPTH) if SYNC_MODE else None
+    live_server = XVIZStreamServer(LIVE_PORT) if LIVE_PORT else None
+    supervisor = ConnectionSupervisor(scenario, fatal=(ReplayFinished,))
+
+    def signal_handler(signum, stop):
+        shutdown(scenario, tick_driver, live_server)
+        logger.info("User ctrl+c exit.")
+        os.kill(os.getpid(), signal.SIGKILL)
+
     signal.signal(signal.SIGINT, signal_handler)
     
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     sink = DirectorySource(OUTPUT_DIR)
     
-    # glb_writer = XVIZGLBWriter(sink)
+    if live_server is not None:
+        live_server.start()
+        metrics.add_collector(lambda: {'live': live_server.stats()})
+        sink = live_server.source(sink)
+
+    glb_writer = XVIZGLBWriter(sink)
     # json_writer = XVIZJsonWriter(sink)
 
-    scenario.get_client()
+    if METRICS_PORT:
+        MetricsServer(METRICS_PORT).start()
+
+    supervisor.connect()
+    metrics.add_collector(lambda: {'connection': supervisor.stats()})
     
     # world = client.get_world()
     # map = world.get_map()
@@ -33,15 +78,56 @@ def main():
     """
         Carla Map Data.
     """
-    map_json = scenario.get_map_json()
-    with open(OUTPUT_DIR + 'map.json', 'w') as fout:
-        fout.write(json.dumps(map_json)) 
+    map_geometry = scenario.get_map_geometry()
+    map_geometry.load()
+
+    # export again when an output is missing or the map or settings changed
+    map_outputs = [OUTPUT_DIR + 'map.json']
+    if MAP_LODS:
+        map_outputs += [lod_path(OUTPUT_DIR + 'map.json', level) for level in range(len(LOD_TOLERANCES))]
+    if MAP_TILE_SIZE:
+        map_outputs.append(OUTPUT_DIR + 'tiles/' + INDEX_FILE)
+    export_params = {
+        'map': map_geometry.key,
+        'decimals': MAP_DECIMALS,
+        'tolerance': MAP_TOLERANCE,
+        'lods': list(LOD_TOLERANCES) if MAP_LODS else None,
+        'tile_size': MAP_TILE_SIZE,
+    }
+    if not export_current(OUTPUT_DIR + 'map.export.json', export_params, map_outputs):
+        scenario.export_map(OUTPUT_DIR + 'map.json', decimals=MAP_DECIMALS, tolerance=MAP_TOLERANCE)
+        if MAP_LODS:
+            scenario.export_map_lods(OUTPUT_DIR + 'map.json', decimals=MAP_DECIMALS)
+        if MAP_TILE_SIZE:
+            scenario.export_map_tiles(OUTPUT_DIR + 'tiles/', MAP_TILE_SIZE,
+                                      decimals=MAP_DECIMALS, tolerance=MAP_TOLERANCE)
+        write_export_params(OUTPUT_DIR + 'map.export.json', export_params)
+
+    # build the spatial index now rather than on the first tick
+    scenario.get_map_index()
+
+    if RECORD_IMAGES:
+        scenario.enable_recording(OUTPUT_DIR + 'images/', codec=RECORD_CODEC)
+
+    scenario.enable_xviz(glb_writer)
+    if RECORD_SESSION:
+        scenario.start_recorder(RECORD_SESSION)
+    if PLOT_TELEMETRY:
+        scenario.enable_telemetry()
 
     threading.Thread(target=scenario.sensor_process, daemon=True).start()
     scenario.register_sensor()
     
-    while True:
-        scenario.get_update_data()
+    try:
+        if tick_driver is not None:
+            tick_driver.run(supervisor)
+        else:
+            while True:
+                supervisor.call(scenario.get_update_data)
+    except ReplayFinished as e:
+        logger.info("Replay finished : {}".format(e))
+    finally:
+        shutdown(scenario, tick_driver, live_server)
 
 
     # glb_writer.write_message(scenario.get_metabuilder().get_message())
@@ -0,0 +1,58 @@
+"""
+    Carla Actor Geometry
+"""
+
+import numpy as np
+
+from scenarios.map_geometry import DEG_1_AS_RAD
+
+# footprint corner order, in units of the bounding box extent
+_CORNERS = np.array([[1.0, 1.0], [1.0, -1.0], [-1.0, -1.0], [-1.0, 1.0]])
+
+
+class ActorBatch:
+    """
+        Column arrays for a group of actors from one snapshot.
+    """
+    __slots__ = ('ids', 'location', 'rotation', 'bbox_location', 'extent')
+
+    def __init__(self, ids, location, rotation, bbox_location, extent) -> None:
+        self.ids = ids                      # (N,) int64
+        self.location = location            # (N, 3) carla coordinates
+        self.rotation = rotation            # (N, 3) roll, pitch, yaw in degrees
+        self.bbox_location = bbox_location  # (N, 3) box center, actor frame
+        self.extent = extent                # (N, 3) box half size
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def from_states(states):
+        if not states:
+            empty = np.zeros((0, 3))
+            return ActorBatch(np.zeros(0, dtype=np.int64), empty, empty, empty, empty)
+
+        return ActorBatch(np.array([s.id for s in states], dtype=np.int64),
+                          np.array([s.location for s in states], dtype=np.float64),
+                          np.array([s.rotation for s in states], dtype=np.float64),
+                          np.array([s.bbox_location for s in states], dtype=np.float64),
+                          np.array([s.extent for s in states], dtype=np.float64))
+
+
+def footprints(batch):
+    """
+        Bottom face of every bounding box at once, y flipped like the map.
+        Returns (N, 4, 3).
+    """
+    yaw = batch.rotation[:, 2] * DEG_1_AS_RAD
+    c, s = np.cos(yaw)[:, None], np.sin(yaw)[:, None]
+
+    # corners in the actor frame, (N, 4)
+    px = batch.bbox_location[:, 0:1] + _CORNERS[:, 0] * batch.extent[:, 0:1]
+    py = batch.bbox_location[:, 1:2] + _CORNERS[:, 1] * batch.extent[:, 1:2]
+
+    polygons = np.empty((len(batch), 4, 3))
+    polygons[:, :, 0] = batch.location[:, 0:1] + c * px - s * py
+    polygons[:, :, 1] = -(batch.location[:, 1:2] + s * px + c * py)
+    polygons[:, :, 2] = (batch.location[:, 2] + batch.bbox_location[:, 2] - batch.extent[:, 2])[:, None]
+    return polygons
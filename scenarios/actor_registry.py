@@ -0,0 +1,87 @@
+"""
+    Carla Actor Registry
+"""
+
+from loguru import logger
+
+
+class ActorInfo:
+    __slots__ = ('id', 'actor', 'type_id', 'role_name', 'attributes', 'bbox_location', 'extent')
+
+    def __init__(self, actor) -> None:
+        bbox = actor.bounding_box
+        self.id = actor.id
+        self.actor = actor
+        self.type_id = actor.type_id
+        self.attributes = dict(actor.attributes)
+        self.role_name = self.attributes.get('role_name')
+        self.bbox_location = (bbox.location.x, bbox.location.y, bbox.location.z)
+        self.extent = (bbox.extent.x, bbox.extent.y, bbox.extent.z)
+
+
+class ActorRegistry:
+    """
+        Static actor data keyed by actor id. update() diffs the ids of a
+        world snapshot against the known ones and only asks the server about
+        spawned actors, in one get_actors() call.
+    """
+    def __init__(self, world) -> None:
+        self._world = world
+        self._actors = {}  # {id: ActorInfo}
+
+        self.spawned = []
+        self.destroyed = []
+
+    def rebind(self, world):
+        """
+            Switches to a new world connection: actor handles are fetched
+            again, static data of actors that still exist is kept. A
+            restarted server reuses ids for other actors, so an entry whose
+            type or role changed is dropped and picked up by the next update().
+        """
+        self._world = world
+        ids = list(self._actors)
+        alive = {actor.id: actor for actor in world.get_actors(ids)} if ids else {}
+        kept = 0
+        for id in ids:
+            actor, info = alive.get(id), self._actors[id]
+            if actor is None or actor.type_id != info.type_id \
+                    or actor.attributes.get('role_name') != info.role_name:
+                del self._actors[id]
+            else:
+                info.actor = actor
+                kept += 1
+        logger.info('actors rebound {} of {}'.format(kept, len(ids)))
+
+    def update(self, snapshot):
+        ids = {actor_snapshot.id for actor_snapshot in snapshot}
+
+        self.destroyed = [id for id in self._actors if id not in ids]
+        for id in self.destroyed:
+            del self._actors[id]
+
+        new_ids = [id for id in ids if id not in self._actors]
+        self.spawned = []
+        if new_ids:
+            for actor in self._world.get_actors(new_ids):
+                info = ActorInfo(actor)
+                self._actors[info.id] = info
+                self.spawned.append(info)
+
+        if self.spawned or self.destroyed:
+            logger.info('actors +{} -{}'.format(len(self.spawned), len(self.destroyed)))
+
+    def get(self, id):
+        return self._actors.get(id)
+
+    def values(self):
+        return self._actors.values()
+
+    def find_role(self, role_name):
+        for info in self._actors.values():
+            if info.role_name == role_name:
+                return info
+        return None
+
+    def of_type(self, prefix):
+        return [info for info in self._actors.values() if info.type_id.startswith(prefix)]
@@ -0,0 +1,70 @@
+"""
+    Bounded Queue
+"""
+
+from queue import Queue
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+
+
+class BoundedQueue(Queue):
+    """
+        queue.Queue with a fixed size and a policy for what happens when
+        a producer finds it full:
+            DROP_OLDEST: discard the oldest item and enqueue the new one
+            DROP_NEWEST: discard the new item
+            BLOCK:       wait like a plain Queue (put timeout still applies)
+    """
+    def __init__(self, maxsize=64, policy=DROP_OLDEST) -> None:
+        if maxsize <= 0:
+            raise ValueError('BoundedQueue needs a positive maxsize')
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError('unknown queue policy {}'.format(policy))
+
+        super().__init__(maxsize)
+        self.policy = policy
+        self.dropped = 0
+        self.put_count = 0
+        self.high_water = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.policy == BLOCK:
+            super().put(item, block, timeout)
+            with self.mutex:
+                self.put_count += 1
+                self.high_water = max(self.high_water, self._qsize())
+            return
+
+        with self.mutex:
+            self.put_count += 1
+            if self._qsize() >= self.maxsize:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    return
+                # the evicted item is never handed out, so it takes over
+                # its unfinished_tasks slot instead of adding a new one
+                self._get()
+            else:
+                self.unfinished_tasks += 1
+            self._put(item)
+            self.high_water = max(self.high_water, self._qsize())
+            self.not_empty.notify()
+
+    def put_sentinel(self, item=None):
+        """
+            Blocking put that bypasses the drop policy, for the marker that
+            stops the consumer: it must never be dropped or evict data.
+        """
+        Queue.put(self, item)
+
+    def stats(self):
+        with self.mutex:
+            return {
+                'size': self._qsize(),
+                'maxsize': self.maxsize,
+                'high_water': self.high_water,
+                'put': self.put_count,
+                'dropped': self.dropped,
+            }
@@ -3,26 +3,55 @@ import math
 import carla
 from loguru import logger
 import traceback
-from queue import Queue
 from time import sleep
 import cv2
-import numpy as np
 
-import matplotlib.pyplot as plt
+
+from scenarios.map_geometry import MapGeometry
+from scenarios.map_cache import MapCache
+from scenarios.map_export import GeoJsonWriter, LOD_TOLERANCES, write_lods
+from scenarios.map_tiles import write_tiles
+from scenarios.sensor_sync import FrameAggregator
+from scenarios.bounded_queue import DROP_OLDEST
+from scenarios.image_decoder import ImageDecoder
+from scenarios.image_sink import ImageSink
+from scenarios.xviz_pipeline import XVIZFramePipeline, FrameSnapshot, actor_state
+from scenarios.carla_xviz import CarlaXviz
+from scenarios.actor_geometry import ActorBatch
+from scenarios.actor_registry import ActorRegistry
+from scenarios.spatial_index import MapIndex
+from scenarios.traffic_lights import TrafficLightTracker, trigger_areas
+from scenarios.metrics import metrics
+from scenarios.recording import Recorder
+from scenarios.telemetry import TelemetryPlotter
+from scenarios.sensor import SampleColumns, EGO_FIELDS, IMU_FIELDS, EGO_VELOCITY, EGO_ACCELERATION, \
+    IMU_ACCELEROMETER, IMU_GYROSCOPE
+from scenarios.point_cloud import PointCloud, PointCloudFilter, decode_lidar, decode_radar, radar_to_points, to_world
+from concurrent.futures import Future, ThreadPoolExecutor
 
 DEG_1_AS_RAD  = math.pi / 180
 DEG_90_AS_RAD = 90 * DEG_1_AS_RAD
 M_PI		  = 3.14159265358979323846
 
+# {stream: (maxsize, policy)}
+QUEUE_CONFIG = {
+    'sensor'  : (8, DROP_OLDEST),
+}
+
+# samples of ego motion and IMU history kept
+HISTORY_SIZE = 4096
+
 class CarlaScenario:
     """
         c_client: carla client
         c_map: Carla map
     """
-    def __init__(self, host='localhost', port=2000, time_out=3) -> None:
+    def __init__(self, host='localhost', port=2000, time_out=3, map_cache_dir=None, queue_config=None,
+                 lidar_filter=None, radar_filter=None, nearby_radius=80.0, client=None) -> None:
         self._host = host
         self._port = port
         self._timeout = time_out
+        self._client = client  # stand-in client, e.g. scenarios.replay.ReplayClient
 
         self.run = True
 
@@ -32,77 +61,141 @@ class CarlaScenario:
         self.ego_vehicle = None
 
         self.traffic_lights = {}  # {id, []}
+        self.traffic_light_tracker_ = None
         
         self.c_client = None
         self.c_world = None
         self.c_map = None
+        self.map_geometry_ = None
+        self.map_cache_ = MapCache(map_cache_dir) if map_cache_dir else None
+        self.map_index_ = None
+        self.nearby_radius_ = nearby_radius
+        self.actor_registry_ = None
         
+        queue_config = dict(QUEUE_CONFIG, **(queue_config or {}))
         self.listen_sensor = {}
-        self.frame_queue_ = Queue()
-        self.imu_queue_ = Queue()
-        self.image_queue_ = Queue()
-        self.ego_acc = Queue()
-        self.ego_vel = Queue()
+        self.sensor_types_ = {}
+        self.sensor_sync_ = FrameAggregator(ready_size=queue_config['sensor'][0],
+                                            ready_policy=queue_config['sensor'][1])
+        self.ego_motion_ = SampleColumns(EGO_FIELDS, HISTORY_SIZE)
+        self.imu_samples_ = SampleColumns(IMU_FIELDS, HISTORY_SIZE)
+        self.image_decoder_ = ImageDecoder()
+        # crop, voxel filter and world transform of lidar/radar sweeps, numpy drops the GIL
+        self.point_executor_ = ThreadPoolExecutor(max_workers=2, thread_name_prefix='point_cloud')
+        self.lidar_filter_ = lidar_filter or PointCloudFilter()
+        self.radar_filter_ = radar_filter or PointCloudFilter()
+        self.image_sink_ = None
+        self.xviz_pipeline_ = None
+        self.sensor_errors_ = 0
+        self.recorder_ = None
+        self.telemetry_ = None
+        metrics.add_collector(self.queue_stats)
 
     def get_client(self):
+        # handles are only replaced once all of them were fetched, a failed
+        # attempt leaves the previous connection state as it was
         try:
-            self.c_client = carla.Client(self._host, self._port)
-            self.c_client.set_timeout(self._timeout)
+            c_client = self._client or carla.Client(self._host, self._port)
+            c_client.set_timeout(self._timeout)
 
-            self.c_world = self.c_client.get_world()
-            self.c_map = self.c_world.get_map()
+            c_world = c_client.get_world()
+            c_map = c_world.get_map()
         except:
             logger.info(traceback.format_exc())
+            raise
+
+        self.c_client, self.c_world, self.c_map = c_client, c_world, c_map
+        if self.actor_registry_ is None:
+            self.actor_registry_ = ActorRegistry(self.c_world)
+        else:
+            self.actor_registry_.rebind(self.c_world)
+
+    def reconnect(self):
+        """
+            Connects again after the server went away. Map geometry and lane
+            index stay when the server still runs the same map, the actor registry
+            keeps its static data and the sensors are subscribed once more.
+        """
+        for sensor_id, sensor in self.listen_sensor.items():
+            try:
+                sensor.stop()
+            except RuntimeError:
+                pass
+            self.sensor_sync_.unregister(sensor_id)
+        self.listen_sensor.clear()
+        # a restarted server counts frames from the start again
+        self.sensor_sync_.reset()
+
+        map_name = self.c_map.name if self.c_map is not None else None
+        self.get_client()
+        if self.c_map.name != map_name:
+            logger.info('map changed {} -> {}'.format(map_name, self.c_map.name))
+            self.map_geometry_ = None
+            self.map_index_ = None
+            self.traffic_lights = {}
+            self.get_map_index()
+        elif self.map_index_ is not None:
+            # same lanes, but traffic light and stop sign ids belong to the old episode
+            self.map_index_.rebind(self.c_world)
+
+        # actor handles of the old connection
+        self.ego_vehicle = None
+        self.traffic_light_tracker_ = None
+
+        self.register_sensor()
 
     # get map json
     def get_map_json(self):
         if self.c_map is None:
             self.get_client()
 
-        topology = self.c_map.get_topology()
-
         map_json = {}
         map_json["type"] = "FeatureCollection"
         map_json["features"] = []
 
-        idx = 0
-        for point_pair in topology:
-            self._add_one_side(point_pair[0], map_json, idx)
-            self._add_one_side(point_pair[1], map_json, idx + 2)
-            idx+=4
+        for segment in self.get_map_geometry().segments:
+            self._add_one_line(segment.points, segment.road_id, map_json, segment.idx)
 
         return map_json
 
+    def export_map(self, path, decimals=None, compress=False, tolerance=None):
+        if self.c_map is None:
+            self.get_client()
+
+        with GeoJsonWriter(path, decimals=decimals, compress=compress, tolerance=tolerance) as writer:
+            count = writer.write_segments(self.get_map_geometry().iter_segments())
+        logger.info('map export {} : {} features, {} vertices'.format(path, count, writer.vertices))
+
+    def export_map_lods(self, path, tolerances=LOD_TOLERANCES, decimals=None, compress=False):
+        if self.c_map is None:
+            self.get_client()
+
+        vertices = write_lods(self.get_map_geometry().iter_segments(), path, tolerances,
+                              decimals=decimals, compress=compress)
+        for lod, count in vertices.items():
+            logger.info('map export {} : {} vertices'.format(lod, count))
+        return list(vertices)
+
+    def export_map_tiles(self, directory, tile_size=200.0, decimals=None, tolerance=None, workers=None):
+        if self.c_map is None:
+            self.get_client()
+
+        return write_tiles(self.get_map_geometry().segments, directory, tile_size,
+                           decimals=decimals, tolerance=tolerance, workers=workers)
+
+    def get_map_geometry(self):
+        if self.map_geometry_ is None:
+            self.map_geometry_ = MapGeometry(self.c_map, cache=self.map_cache_)
+        return self.map_geometry_
+
+    def get_map_index(self):
+        if self.map_index_ is None:
+            self.map_index_ = MapIndex.build(self.get_map_geometry(), self.c_world)
+        return self.map_index_
+
     def _add_one_side(self, waypoint, map_dict, idx):
-        precision_ = 0.5
-
-        waypoints = []
-        road_id = waypoint.road_id
-        next_waypoints = waypoint.next(precision_)
-        waypoints.append(waypoint)
-
-        while (next_waypoints):
-            next_waypoint = next_waypoints[0]
-            if (next_waypoint.road_id == road_id):
-                waypoints.append(next_waypoint)
-                next_waypoints = next_waypoint.next(precision_)
-            else:
-                break
-
-        # logger.info(waypoints)
-        points = []
-        for waypoint in waypoints:
-            points.append(self._lateral_shift(waypoint.transform, -waypoint.lane_width*0.5))
-
-        self._add_one_line(points, road_id, map_dict, idx)
-
-    
-    def _lateral_shift(self, transform, shift):
-        transform.rotation.yaw += 90.0
-        p1 = [transform.location.x, transform.location.y, transform.location.z]
-        tmp = shift * transform.get_forward_vector()
-        p2 = [tmp.x, tmp.y, tmp.z]
-        return [p1[0] + p2[0], p1[1] + p2[1], p1[2] + p2[2]]
+        segment = self.get_map_geometry().sample_segment(waypoint, idx)
+        self._add_one_line(segment.points, segment.road_id, map_dict, idx)
 
     def _add_one_line(self, points, road_id, map_dict, idx):
         feature = dict()
@@ -110,24 +203,46 @@ class CarlaScenario:
         feature["type"] = "Feature"
         feature["properties"] = {"name" : str(road_id)}
 
-        coordinates = []
-        for point in points:
-            coordinates.append([point[0], -point[1], point[2]])
-
         feature["geometry"] = {
-            "coordinates" : coordinates,
+            "coordinates" : points.tolist(),
             "type" : "LineString"
         }
 
         map_dict["features"].append(feature)
 
     @staticmethod
-    def _imu_callback(data, id, queue):
-        queue.put_nowait({data.frame: {id : data}})
+    def _imu_callback(data, id, sensor_sync):
+        metrics.start('imu', data.frame, id)
+        sensor_sync.put(data.frame, id, data)
+        metrics.stage('imu', data.frame, 'enqueue', id)
+
+    @staticmethod
+    def _image_callback(data, id, sensor_sync, decoder):
+        metrics.start('camera', data.frame, id)
+        sensor_sync.put(data.frame, id, decoder.submit(id, data))
+        metrics.stage('camera', data.frame, 'enqueue', id)
 
     @staticmethod
-    def _image_callback(data, id, queue):
-        queue.put_nowait({data.frame: {id : data}})
+    def _lidar_callback(data, id, sensor_sync, executor, point_filter):
+        metrics.start('lidar', data.frame, id)
+        sensor_sync.put(data.frame, id, executor.submit(CarlaScenario._lidar_points, data, point_filter))
+        metrics.stage('lidar', data.frame, 'enqueue', id)
+
+    @staticmethod
+    def _radar_callback(data, id, sensor_sync, executor, point_filter):
+        metrics.start('radar', data.frame, id)
+        sensor_sync.put(data.frame, id, executor.submit(CarlaScenario._radar_points, data, point_filter))
+        metrics.stage('radar', data.frame, 'enqueue', id)
+
+    @staticmethod
+    def _lidar_points(data, point_filter):
+        points = point_filter.apply(decode_lidar(data))
+        return PointCloud('/lidar/points', data.frame, to_world(points, data.transform))
+
+    @staticmethod
+    def _radar_points(data, point_filter):
+        points = point_filter.apply(radar_to_points(decode_radar(data)))
+        return PointCloud('/radar/points', data.frame, to_world(points, data.transform))
 
     @staticmethod
     def compute_speed(v):
@@ -137,88 +252,83 @@ class CarlaScenario:
         if self.c_world is None:
             self.get_client()
 
-        actor_list = self.c_world.get_actors()
-        # logger.info(actor_list)
-
-        # sensor = None
-        for actor in actor_list:
-            actor_type = actor.type_id
-            sensor = self.c_world.get_actor(actor.id)
-            if actor_type == 'sensor.other.imu':
-                sensor_id = sensor.id 
-                if not self.listen_sensor.get(actor_list):
-                    self.listen_sensor[sensor_id] = sensor
-    
-                    sensor.listen(lambda data: CarlaScenario._imu_callback(data, sensor_id, self.imu_queue_))
-            elif actor_type == 'sensor.camera.rgb':
-                sensor_id = sensor.id
-                if not self.listen_sensor.get(actor_list):
-                    self.listen_sensor[sensor_id] = sensor
-                    sensor.listen(lambda data: CarlaScenario._image_callback(data, sensor_id, self.image_queue_))
-            else:
-                pass
+        self.actor_registry_.update(self.c_world.get_snapshot())
+
+        callbacks = {
+            'sensor.other.imu' : lambda data, sensor_id: CarlaScenario._imu_callback(data, sensor_id, self.sensor_sync_),
+            'sensor.camera.rgb' : lambda data, sensor_id: CarlaScenario._image_callback(data, sensor_id, self.sensor_sync_, self.image_decoder_),
+            'sensor.lidar.ray_cast' : lambda data, sensor_id: CarlaScenario._lidar_callback(data, sensor_id, self.sensor_sync_, self.point_executor_, self.lidar_filter_),
+            'sensor.other.radar' : lambda data, sensor_id: CarlaScenario._radar_callback(data, sensor_id, self.sensor_sync_, self.point_executor_, self.radar_filter_),
+        }
+
+        for info in self.actor_registry_.values():
+            callback = callbacks.get(info.type_id)
+            if callback is not None and not self.listen_sensor.get(info.id):
+                self._listen(info.actor, info.type_id, callback)
+
+
+    def _listen(self, sensor, actor_type, callback):
+        sensor_id = sensor.id
+        self.listen_sensor[sensor_id] = sensor
+        self.sensor_types_[sensor_id] = actor_type
+        self.sensor_sync_.register(sensor_id)
+
+        def on_data(data):
+            if self.recorder_ is not None:
+                self.recorder_.record_sensor(sensor_id, actor_type, data)
+            callback(data, sensor_id)
+
+        sensor.listen(on_data)
 
-        # for snapshot in snapshots:
-        #     id = snapshot.id
-        #     actor = 
-        #     if self.ego_vehicle is not None:
-        #         continue
-            
-        #     for _key, _value in actor.attributes.items():
-        #         if (_key == "role_name" and _value == "ego_vehicle"):
-        #             self.ego_vehicle = actor
-        #             logger.info('{} : {}'.format(_key, _value))
-    
     def sensor_process(self):
-        plt.ion()   
-        # plt.style.use("ggplot")
-        # fig, ax = plt.subplots(figsize=(12, 7))
-        acc_list = []
-        vel_list = []
-        x = []
-        i = 0.05
         while self.run:
-            frame_id = self.frame_queue_.get()
-            imu_data = self.imu_queue_.get()
-            if imu_data:
-                imu = imu_data.get(frame_id)
-                # if imu:
-                #     logger.info(imu)
-
-            image_data = self.image_queue_.get()
-            if image_data:
-                img = image_data.get(frame_id-1)
-                if img:
-                    for k, v in img.items():
-                        array = np.frombuffer(v.raw_data, dtype=np.dtype("uint8"))
-                        array = np.reshape(array, (v.height, v.width, 4))
-                        array = array[:, :, :3]
-                        cv2.imshow('img', array)
-                        cv2.waitKey(1)
-                        # cv2.imwrite('_out/{}.png'.format(frame_id), array)
-            
-            # acc_data = self.ego_acc.get()
-            # if acc_data:
-            #     acc = acc_data.get(frame_id)
-            #     acc = CarlaScenario.compute_speed(acc)
-            #     # logger.info('{} : {} - {} -{}'.format(frame_id, acc.x, acc.y, acc.z))
-            #     logger.info(acc)
-            #     acc_list.append(acc)
-
-            # vel_data = self.ego_vel.get()
-            # if vel_data:
-            #     vel = vel_data.get(frame_id)
-            #     vel = CarlaScenario.compute_speed(vel)
-            #     logger.info(vel)
-            #     vel_list.append(vel)
-            #     # logger.info('{} : {} - {} -{}'.format(frame_id, vel.x, vel.y, vel.z))
-
-            # x.append(i)
-            # i+=0.05
-            # plt.clf() 
-            # plt.plot(x, acc_list)
-            # plt.plot(x, vel_list)
-            # plt.pause(0.001)
+            bundle = self.sensor_sync_.get(timeout=1.0)
+            if bundle is None:
+                continue
+
+            frame_id, sensors = bundle
+            if frame_id % 200 == 0:
+                logger.info(self.queue_stats())
+                logger.info(metrics.summary())
+
+            for k, v in sensors.items():
+                if self.sensor_types_.get(k) == 'sensor.other.imu':
+                    metrics.stage('imu', frame_id, 'dequeue', k)
+                    imu = v
+                    acc, gyro = imu.accelerometer, imu.gyroscope
+                    self.imu_samples_.append(frame_id, imu.timestamp, acc.x, acc.y, acc.z,
+                                             gyro.x, gyro.y, gyro.z, imu.compass)
+                    if self.telemetry_ is not None:
+                        self.telemetry_.write('imu', imu.timestamp,
+                                              self.imu_samples_.magnitude(IMU_ACCELEROMETER, 1)[0],
+                                              self.imu_samples_.magnitude(IMU_GYROSCOPE, 1)[0])
+                    metrics.stage('imu', frame_id, 'output', k, done=True)
+                elif self.sensor_types_.get(k) == 'sensor.camera.rgb':
+                    metrics.stage('camera', frame_id, 'dequeue', k)
+                    try:
+                        image = v.result()
+                    except Exception as e:
+                        self.sensor_errors_ += 1
+                        logger.info('decode {} frame {} failed : {}'.format(k, frame_id, e))
+                        continue
+                    cv2.imshow('img_{}'.format(k), image.array)
+                    if self.image_sink_ is not None:
+                        self.image_sink_.write(k, frame_id, image.array)
+                    image.release()
+                    metrics.stage('camera', frame_id, 'output', k, done=True)
+                elif isinstance(v, Future):
+                    stream = 'lidar' if self.sensor_types_.get(k) == 'sensor.lidar.ray_cast' else 'radar'
+                    metrics.stage(stream, frame_id, 'dequeue', k)
+                    try:
+                        cloud = v.result()
+                    except Exception as e:
+                        self.sensor_errors_ += 1
+                        logger.info('{} {} frame {} failed : {}'.format(stream, k, frame_id, e))
+                        continue
+                    if self.xviz_pipeline_ is not None:
+                        self.xviz_pipeline_.update_points(cloud.stream, cloud.points)
+                    metrics.stage(stream, frame_id, 'output', k, done=True)
+            cv2.waitKey(1)
 
     # def image_process(self):
     #     while self.run:
@@ -228,41 +338,141 @@ class CarlaScenario:
     #         if imu_data:
     #             logger.info(imu_data)
 
+    def enable_recording(self, output_dir, codec='jpg', quality=None):
+        self.image_sink_ = ImageSink(output_dir, codec=codec, quality=quality)
+        # the encoded frames double as the XVIZ camera images
+        self.image_sink_.add_listener(self._on_encoded_image)
+        return self.image_sink_
+
+    def _on_encoded_image(self, sensor_id, frame, codec, data, shape):
+        if self.xviz_pipeline_ is not None:
+            self.xviz_pipeline_.update_image(sensor_id, data, shape[1], shape[0])
+
+    def start_recorder(self, path):
+        if self.c_map is None:
+            self.get_client()
+        self.recorder_ = Recorder(path, self.c_map)
+        return self.recorder_
+
+    def enable_telemetry(self, window=30.0, max_points=500):
+        self.telemetry_ = TelemetryPlotter(window=window, max_points=max_points).start()
+        return self.telemetry_
+
+    def enable_xviz(self, writer):
+        self.xviz_pipeline_ = XVIZFramePipeline(CarlaXviz(), writer)
+        return self.xviz_pipeline_
+
+    def queue_stats(self):
+        return {
+            'sensor' : self.sensor_sync_.stats(),
+            'sensor_errors' : self.sensor_errors_,
+            'ego_motion' : self.ego_motion_.stats(),
+            'imu' : self.imu_samples_.stats(),
+            'image_sink' : self.image_sink_.stats() if self.image_sink_ else None,
+            'xviz' : self.xviz_pipeline_.stats() if self.xviz_pipeline_ else None,
+        }
+
     def get_update_data(self):
         if self.c_world is None:
             self.get_client()
 
         snapshots = self.c_world.wait_for_tick(seconds=2.0)
+        self.process_snapshot(snapshots)
 
+    def process_snapshot(self, snapshots):
+        metrics.start('world', snapshots.frame)
         now_time = snapshots.timestamp.elapsed_seconds
         now_frame = snapshots.frame
         # logger.info(now_frame)
-        self.frame_queue_.put_nowait(now_frame)
 
         if self.start_time is None:
             self.start_time = now_time
         
+        self.actor_registry_.update(snapshots)
+        if self.recorder_ is not None:
+            self.recorder_.record_tick(snapshots, self.actor_registry_)
+
+        if self.ego_vehicle is None or self.ego_vehicle.id in self.actor_registry_.destroyed:
+            info = self.actor_registry_.find_role('ego_vehicle')
+            self.ego_vehicle = info.actor if info else None
+            if info:
+                logger.info('{} : {}'.format('role_name', info.role_name))
+
         if self.ego_vehicle is None:
-            
-            for snapshot in snapshots:
-                id = snapshot.id
-                actor = self.c_world.get_actor(id)
-            
-                for _key, _value in actor.attributes.items():
-                    if (_key == "role_name" and _value == "ego_vehicle"):
-                        self.ego_vehicle = actor
-                        logger.info('{} : {}'.format(_key, _value))
-        
-        self.ego_acc.put_nowait({now_frame : self.ego_vehicle.get_acceleration()})
-        self.ego_vel.put_nowait({now_frame : self.ego_vehicle.get_velocity()})
+            return
+
+        ego_snapshot = snapshots.find(self.ego_vehicle.id)
+        vel, acc = ego_snapshot.get_velocity(), ego_snapshot.get_acceleration()
+        self.ego_motion_.append(now_frame, now_time, vel.x, vel.y, vel.z, acc.x, acc.y, acc.z)
+        speed = float(self.ego_motion_.magnitude(EGO_VELOCITY, 1)[0])
+        acceleration = float(self.ego_motion_.magnitude(EGO_ACCELERATION, 1)[0])
+        if self.telemetry_ is not None:
+            self.telemetry_.write('ego', now_time, speed, acceleration)
+
+        if self.xviz_pipeline_ is not None:
+            self.xviz_pipeline_.submit(self._frame_snapshot(snapshots, speed, acceleration))
+
+    def _frame_snapshot(self, snapshots, speed, acceleration):
+        vehicles, walkers = [], []
+        ego = None
+        for info in self.actor_registry_.values():
+            actor_snapshot = snapshots.find(info.id)
+            if actor_snapshot is None:
+                continue
+            if info.id == self.ego_vehicle.id:
+                ego = actor_state(info, actor_snapshot)
+            elif info.type_id.startswith('vehicle.'):
+                vehicles.append(actor_state(info, actor_snapshot))
+            elif info.type_id.startswith('walker.pedestrian.'):
+                walkers.append(actor_state(info, actor_snapshot))
+
+        if self.traffic_light_tracker_ is None:
+            self.traffic_light_tracker_ = TrafficLightTracker(self.c_world)
+            self.traffic_lights = self.traffic_light_tracker_.areas
+        self.traffic_light_tracker_.update()
+
+        lanes, stop_signs, traffic_lights = [], [], []
+        if ego is not None:
+            map_index = self.get_map_index()
+            x, y = ego.location[0], -ego.location[1]
+            lanes = [segment.points for segment in map_index.lanes_near(x, y, self.nearby_radius_)]
+            stop_signs = [map_index.stop_signs[id] for id in map_index.stop_signs_near(x, y, self.nearby_radius_)]
+
+            # streams missing from a frame vanish in the viewer, so every frame
+            # carries the nearby set: cached polygons with the tracked states
+            states = self.traffic_light_tracker_.states
+            traffic_lights = [(self.traffic_lights[id], states[id])
+                              for id in sorted(map_index.traffic_lights_near(x, y, self.nearby_radius_))
+                              if id in self.traffic_lights]
+
+        return FrameSnapshot(snapshots.frame,
+                             snapshots.timestamp.elapsed_seconds,
+                             ego,
+                             speed,
+                             acceleration,
+                             ActorBatch.from_states(vehicles),
+                             ActorBatch.from_states(walkers),
+                             lanes,
+                             stop_signs,
+                             traffic_lights)
 
     def traffic_ight_areas(self, actor):
-        pass
+        return trigger_areas([actor])[actor.id]
 
     def stop_sign_areas(self, actor):
-        pass
+        return trigger_areas([actor])[actor.id]
 
     def clear(self):
         for k, v in self.listen_sensor.items():
             logger.info('stop subscribe from {} : {}'.format(k, v))
-            v.stop()
\ No newline at end of file
+            v.stop()
+        self.image_decoder_.close()
+        self.point_executor_.shutdown(wait=False)
+        if self.image_sink_ is not None:
+            self.image_sink_.close()
+        if self.xviz_pipeline_ is not None:
+            self.xviz_pipeline_.close()
+        if self.recorder_ is not None:
+            self.recorder_.close()
+        if self.telemetry_ is not None:
+            self.telemetry_.close()
\ No newline at end of file
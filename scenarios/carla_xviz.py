@@ -2,6 +2,10 @@
     Carla Visualization
 """
 
+import math
+
+from scenarios.actor_geometry import footprints
+
 from xviz_avs import XVIZBuilder, \
     XVIZMetadataBuilder, \
     ANNOTATION_TYPES,\
@@ -26,6 +30,64 @@ from xviz_avs.builder.xviz_ui_builder import XVIZContainerBuilder,\
 from xviz_avs.builder.declarative_ui import UI_TYPES, UI_LAYOUT, UI_INTERACTIONS
 
 class CarlaXviz:
+    def __init__(self) -> None:
+        self._metadata = None
+
+    def get_frame_message(self, snapshot, points=None, images=None):
+        # xviz_avs primitives take flat [x0, y0, z0, x1, ...] vertex lists
+        if self._metadata is None:
+            self._metadata = self.get_metabuilder().get_message()
+        builder = XVIZBuilder(metadata=self._metadata)
+
+        pose = builder.pose("/vehicle_pose").timestamp(snapshot.timestamp)
+        if snapshot.ego is not None:
+            roll, pitch, yaw = snapshot.ego.rotation
+            x, y, z = snapshot.ego.location
+            pose.position(x, -y, z)\
+                .orientation(-math.radians(roll), -math.radians(pitch), -math.radians(yaw))
+
+        for stream, batch in (("/object/vehicles", snapshot.vehicles),
+                              ("/object/walkers", snapshot.walkers)):
+            if not len(batch):
+                continue
+            for id, polygon in zip(batch.ids.tolist(), footprints(batch).reshape((len(batch), 12)).tolist()):
+                builder.primitive(stream)\
+                    .polygon(polygon)\
+                    .id(str(id))
+
+        for lane in snapshot.lanes:
+            builder.primitive("/map/lanes").polyline(lane.ravel().tolist())
+
+        for x, y, z in snapshot.stop_signs:
+            builder.primitive("/traffic/stop_signs")\
+                .polyline([x, y, z, x, y, z + 2.0])\
+                .classes(["vertical"])
+
+        for polygon, state in snapshot.traffic_lights:
+            builder.primitive("/traffic/traffic_lights")\
+                .polygon(polygon)\
+                .classes([state])
+
+        for stream, cloud in (points or {}).items():
+            if len(cloud):
+                builder.primitive(stream).points(cloud.reshape(-1))
+
+        for sensor_id, (data, width, height) in (images or {}).items():
+            builder.primitive("/camera/images")\
+                .image(data)\
+                .dimensions(width, height)\
+                .id(str(sensor_id))
+
+        builder.time_series("/vehicle/velocity")\
+            .timestamp(snapshot.timestamp)\
+            .value(snapshot.velocity)
+
+        builder.time_series("/vehicle/acceleration")\
+            .timestamp(snapshot.timestamp)\
+            .value(snapshot.acceleration)
+
+        return builder.get_message()
+
     def get_metabuilder(self):
         builder = XVIZMetadataBuilder()
         builder.stream("/vehicle_pose")\
@@ -96,11 +158,20 @@ class CarlaXviz:
                 "extruded": True, 
                 "height": 0.1
             })\
-            .style_class("red_state", {"fill_color": [200, 200, 0, 128]})\
-            .style_class("yellow_state", {"fill_color": [200, 200, 0, 128]})\
-            .style_class("green_state", {"fill_color": [200, 200, 0, 128]})\
-            .style_class("unknown", {"fill_color": [200, 200, 0, 128]})
+            .style_class("red_state", {"fill_color": [255, 0, 0, 160]})\
+            .style_class("yellow_state", {"fill_color": [255, 200, 0, 160]})\
+            .style_class("green_state", {"fill_color": [0, 200, 0, 160]})\
+            .style_class("unknown", {"fill_color": [200, 200, 200, 128]})
         
+        builder.stream("/map/lanes")\
+            .category(CATEGORY.PRIMITIVE)\
+            .type(PRIMITIVE_TYPES.POLYLINE)\
+            .coordinate(COORDINATE_TYPES.IDENTITY)\
+            .stream_style({
+                "stroke_width": 0.15,
+                "stroke_color": [180, 180, 180, 200]
+            })
+
         builder.stream("/lidar/points")\
             .category(CATEGORY.PRIMITIVE)\
             .type(PRIMITIVE_TYPES.POINT)\
@@ -118,6 +189,10 @@ class CarlaXviz:
                 "radius_pixels" : 2
             })
 
+        builder.stream("/camera/images")\
+            .category(CATEGORY.PRIMITIVE)\
+            .type(PRIMITIVE_TYPES.IMAGE)
+
         builder.stream("/drawing/polylines")\
             .category(CATEGORY.PRIMITIVE)\
             .type(PRIMITIVE_TYPES.POLYLINE)\
@@ -146,7 +221,7 @@ class CarlaXviz:
         builder.stream("/sensor/other/imu")\
             .category(CATEGORY.UI_PRIMITIVE)
 
-        builder.ui(self.get_ui([], ['/vehicle/acceleration'], ['/vehicle/velocity'], []))
+        builder.ui(self.get_ui(['/camera/images'], ['/vehicle/acceleration'], ['/vehicle/velocity'], []))
 
         return builder
 
@@ -180,6 +255,10 @@ class CarlaXviz:
                                              description="/sensor/other/imu"))
         tables.child(tables_builder)
 
+        camera = ui_builder.panel("Camera")
+        camera.child(ui_builder.video(cameras=cameras))
+
+        ui_builder.child(camera)
         ui_builder.child(metrics)
         ui_builder.child(tables)
         
@@ -0,0 +1,99 @@
+"""
+    Carla Connection Supervisor
+"""
+
+import random
+from time import sleep
+from loguru import logger
+
+
+class ConnectionSupervisor:
+    """
+        Keeps a CarlaScenario connected. call(step) runs one tick step and
+        treats the RuntimeError carla raises on a timeout or a lost server
+        as a hiccup; after `max_timeouts` of them in a row the scenario
+        reconnects with exponential backoff, keeping its map and actor
+        caches, and subscribes its sensors again.
+
+        fatal: exception types passed through instead, e.g. ReplayFinished
+    """
+    def __init__(self, scenario, max_timeouts=3, backoff=0.5, max_backoff=30.0, fatal=()) -> None:
+        self._scenario = scenario
+        self._max_timeouts = max_timeouts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._fatal = fatal
+        self._before_reconnect = []
+        self._on_reconnect = []
+
+        self.timeouts = 0
+        self.reconnects = 0
+        self.attempts = 0
+
+    def before_reconnect(self, callback):
+        """
+            callback() runs before the scenario reconnects, while the old
+            connection state is still in place, e.g. to finish work that
+            reads the actor registry.
+        """
+        self._before_reconnect.append(callback)
+
+    def on_reconnect(self, callback):
+        """
+            callback() runs after every successful reconnect, e.g. to turn
+            synchronous mode back on.
+        """
+        self._on_reconnect.append(callback)
+
+    def connect(self):
+        """
+            Connects, retrying with backoff until the server answers.
+        """
+        attempt = 0
+        while True:
+            try:
+                if self._scenario.c_world is None:
+                    self._scenario.get_client()
+                else:
+                    self._scenario.reconnect()
+                return
+            except self._fatal:
+                raise
+            except RuntimeError as e:
+                self.attempts += 1
+                delay = min(self._max_backoff, self._backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.info('connect to carla failed ({}), retry in {:.1f} s'.format(e, delay))
+                sleep(delay)
+                attempt += 1
+
+    def call(self, step):
+        try:
+            result = step()
+        except self._fatal:
+            raise
+        except RuntimeError as e:
+            self.timeouts += 1
+            logger.info('tick failed {}/{} : {}'.format(self.timeouts, self._max_timeouts, e))
+            if self.timeouts >= self._max_timeouts:
+                self.reconnect()
+            return None
+
+        self.timeouts = 0
+        return result
+
+    def reconnect(self):
+        for callback in self._before_reconnect:
+            callback()
+        self.connect()
+        self.reconnects += 1
+        self.timeouts = 0
+        for callback in self._on_reconnect:
+            callback()
+        logger.info('reconnected to carla {}'.format(self.stats()))
+
+    def stats(self):
+        return {
+            'timeouts': self.timeouts,
+            'reconnects': self.reconnects,
+            'attempts': self.attempts,
+        }
@@ -0,0 +1,70 @@
+"""
+    Carla Image Decoder
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+class DecodedImage:
+    __slots__ = ('sensor_id', 'frame', 'array', '_decoder')
+
+    def __init__(self, sensor_id, frame, array, decoder) -> None:
+        self.sensor_id = sensor_id
+        self.frame = frame
+        self.array = array  # contiguous (h, w, 3) uint8 BGR
+        self._decoder = decoder
+
+    def release(self):
+        """
+            Hand the buffer back for reuse, `array` must not be used afterwards.
+        """
+        if self._decoder is not None:
+            self._decoder._release(self.array)
+            self._decoder = None
+
+
+class ImageDecoder:
+    """
+        Converts carla.Image BGRA frames to BGR on a thread pool, writing into
+        preallocated buffers that are recycled through DecodedImage.release().
+        cv2 drops the GIL while converting, so cameras decode in parallel.
+
+        buffers: free buffers kept per image shape
+    """
+    def __init__(self, workers=4, buffers=8) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image_decoder')
+        self._buffers = buffers
+        self._lock = threading.Lock()
+        self._free = {}  # {(h, w): [np.ndarray]}
+
+        self.allocated = 0
+
+    def submit(self, sensor_id, image):
+        return self._executor.submit(self.decode, sensor_id, image)
+
+    def decode(self, sensor_id, image):
+        # raw_data is wrapped, not copied; the only copy is the BGRA->BGR conversion
+        bgra = np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))
+        bgr = self._acquire(image.height, image.width)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=bgr)
+        return DecodedImage(sensor_id, image.frame, bgr, self)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _acquire(self, height, width):
+        with self._lock:
+            free = self._free.get((height, width))
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return np.empty((height, width, 3), dtype=np.uint8)
+
+    def _release(self, array):
+        with self._lock:
+            free = self._free.setdefault(array.shape[:2], [])
+            if len(free) < self._buffers:
+                free.append(array)
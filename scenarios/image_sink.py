@@ -0,0 +1,109 @@
+"""
+    Carla Image Sink
+"""
+
+import os
+import threading
+from time import monotonic
+import cv2
+import numpy as np
+from loguru import logger
+
+from scenarios.bounded_queue import BoundedQueue, BLOCK
+from scenarios.process_pool import spawn_pool
+
+CODECS = {
+    'jpg': (cv2.IMWRITE_JPEG_QUALITY, 90),
+    'png': (cv2.IMWRITE_PNG_COMPRESSION, 3),
+}
+
+
+def _encode(buffer, shape, codec, quality):
+    array = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+    flag, _ = CODECS[codec]
+    ok, data = cv2.imencode('.' + codec, array, [flag, quality])
+    if not ok:
+        raise RuntimeError('cv2.imencode failed for {}'.format(codec))
+    return data.tobytes()
+
+
+class ImageSink:
+    """
+        Encodes BGR frames on a process pool and writes them, in submission
+        order, to {output_dir}/{sensor_id}/{frame:08d}.{codec}.
+
+        quality: JPEG quality (0-100) or PNG compression level (0-9)
+        listeners: callables(sensor_id, frame, codec, data, shape) run on
+                   every encoded frame, e.g. to reuse the bytes for XVIZ images
+    """
+    def __init__(self, output_dir, codec='jpg', quality=None, workers=None,
+                 max_pending=32, policy=BLOCK) -> None:
+        if codec not in CODECS:
+            raise ValueError('unsupported codec {}'.format(codec))
+
+        self._output_dir = output_dir
+        self._codec = codec
+        self._quality = CODECS[codec][1] if quality is None else quality
+        self._executor = spawn_pool(workers)
+        self._pending = BoundedQueue(max_pending, policy)
+        self._listeners = []
+
+        self.frames = 0
+        self.bytes = 0
+        self.errors = 0
+        self._start = None
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def write(self, sensor_id, frame, array):
+        if self._start is None:
+            self._start = monotonic()
+        # copy out now, the caller's buffer is recycled before the pool pickles it
+        future = self._executor.submit(_encode, array.tobytes(), array.shape, self._codec, self._quality)
+        self._pending.put((sensor_id, frame, array.shape, future))
+
+    def stats(self):
+        elapsed = monotonic() - self._start if self._start else 0.0
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'errors': self.errors,
+            'fps': self.frames / elapsed if elapsed else 0.0,
+            'mb_per_s': self.bytes / elapsed / 1e6 if elapsed else 0.0,
+            'pending': self._pending.stats(),
+        }
+
+    def close(self):
+        self._pending.put_sentinel()
+        self._writer.join()
+        self._executor.shutdown()
+        logger.info('image sink closed {}'.format(self.stats()))
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+
+            sensor_id, frame, shape, future = item
+            try:
+                data = future.result()
+            except Exception as e:
+                self.errors += 1
+                logger.info('encode {} {} failed : {}'.format(sensor_id, frame, e))
+                continue
+
+            sensor_dir = os.path.join(self._output_dir, str(sensor_id))
+            os.makedirs(sensor_dir, exist_ok=True)
+            with open(os.path.join(sensor_dir, '{:08d}.{}'.format(frame, self._codec)), 'wb') as fout:
+                fout.write(data)
+
+            self.frames += 1
+            self.bytes += len(data)
+
+            for listener in self._listeners:
+                listener(sensor_id, frame, self._codec, data, shape)
@@ -0,0 +1,66 @@
+"""
+    Carla Map Cache
+"""
+
+import os
+import hashlib
+import numpy as np
+from loguru import logger
+
+from scenarios.map_geometry import LaneSegment
+
+CACHE_VERSION = 1
+
+
+class MapCache:
+    """
+        Persists MapGeometry segments as one .npz per (map name, OpenDRIVE hash).
+    """
+    def __init__(self, cache_dir) -> None:
+        self._cache_dir = cache_dir
+
+    @staticmethod
+    def map_key(c_map, precision):
+        digest = hashlib.sha1(c_map.to_opendrive().encode('utf-8'))
+        digest.update('{}:{}'.format(CACHE_VERSION, precision).encode('utf-8'))
+        name = c_map.name.replace('/', '_').replace('\\', '_')
+        return '{}_{}'.format(name, digest.hexdigest()[:16])
+
+    def path(self, key):
+        return os.path.join(self._cache_dir, key + '.npz')
+
+    def load(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                points = data['points']
+                offsets = data['offsets']
+                idx = data['idx']
+                road_id = data['road_id']
+        except Exception as e:
+            logger.info('drop broken map cache {} : {}'.format(path, e))
+            return None
+
+        return [LaneSegment(int(idx[i]), int(road_id[i]), points[offsets[i]:offsets[i + 1]])
+                for i in range(len(idx))]
+
+    def save(self, key, segments):
+        os.makedirs(self._cache_dir, exist_ok=True)
+
+        offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(s.points) for s in segments])
+        points = np.concatenate([s.points for s in segments]) if segments else np.zeros((0, 3))
+
+        path = self.path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as fout:
+            np.savez(fout,
+                     points=points,
+                     offsets=offsets,
+                     idx=np.array([s.idx for s in segments], dtype=np.int64),
+                     road_id=np.array([s.road_id for s in segments], dtype=np.int64))
+        os.replace(tmp_path, path)
+        logger.info('map cache saved {}'.format(path))
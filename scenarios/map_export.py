@@ -0,0 +1,123 @@
+"""
+    Carla Map Export
+"""
+
+import os
+import gzip
+import json
+from contextlib import ExitStack
+import numpy as np
+
+from scenarios.map_geometry import simplify
+
+# simplification tolerance in meters per level of detail, finest first
+LOD_TOLERANCES = (0.05, 0.5, 2.0)
+
+
+class GeoJsonWriter:
+    """
+        Writes a GeoJSON FeatureCollection one LineString at a time so only
+        the current feature is ever held in memory.
+
+        decimals: round coordinates to this many digits (None keeps full precision)
+        compress: gzip the output, implied by a '.gz' suffix
+        tolerance: Douglas-Peucker tolerance in meters (None keeps every vertex)
+    """
+    def __init__(self, path, decimals=None, compress=False, tolerance=None) -> None:
+        self._decimals = decimals
+        self._tolerance = tolerance
+        if compress or path.endswith('.gz'):
+            self._fout = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            self._fout = open(path, 'w', encoding='utf-8')
+
+        self._count = 0
+        self.vertices = 0
+        self._fout.write('{"type": "FeatureCollection", "features": [')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    @property
+    def count(self):
+        return self._count
+
+    def write_feature(self, idx, road_id, points):
+        points = simplify(points, self._tolerance)
+        if self._decimals is not None:
+            points = np.round(points, self._decimals)
+            if self._decimals <= 0:
+                points = points.astype(np.int64)
+
+        feature = {
+            "id": str(idx),
+            "type": "Feature",
+            "properties": {"name": str(road_id)},
+            "geometry": {
+                "coordinates": points.tolist(),
+                "type": "LineString"
+            }
+        }
+
+        if self._count:
+            self._fout.write(', ')
+        self._fout.write(json.dumps(feature))
+        self._count += 1
+        self.vertices += len(points)
+
+    def write_segments(self, segments):
+        for segment in segments:
+            self.write_feature(segment.idx, segment.road_id, segment.points)
+        return self._count
+
+    def close(self):
+        if self._fout is None:
+            return
+        self._fout.write(']}')
+        self._fout.close()
+        self._fout = None
+
+
+def lod_path(path, level):
+    """
+        map.json -> map.lod1.json, map.json.gz -> map.lod1.json.gz
+    """
+    suffix = '.gz' if path.endswith('.gz') else ''
+    root, ext = os.path.splitext(path[:len(path) - len(suffix)])
+    return '{}.lod{}{}{}'.format(root, level, ext, suffix)
+
+
+def write_lods(segments, path, tolerances=LOD_TOLERANCES, decimals=None, compress=False):
+    """
+        Writes one simplified copy of the map per tolerance to lod_path(path, level)
+        in a single pass over `segments`, returns {path: vertices}.
+    """
+    with ExitStack() as stack:
+        writers = [stack.enter_context(GeoJsonWriter(lod_path(path, level), decimals, compress, tolerance))
+                   for level, tolerance in enumerate(tolerances)]
+        for segment in segments:
+            for writer in writers:
+                writer.write_feature(segment.idx, segment.road_id, segment.points)
+    return {lod_path(path, level): writer.vertices for level, writer in enumerate(writers)}
+
+
+def export_current(params_path, params, outputs):
+    """
+        True when every path in `outputs` exists and the export recorded at
+        `params_path` ran with the same `params`.
+    """
+    if not all(os.path.exists(path) for path in outputs):
+        return False
+    try:
+        with open(params_path) as fin:
+            return json.load(fin) == params
+    except (OSError, ValueError):
+        return False
+
+
+def write_export_params(params_path, params):
+    with open(params_path, 'w') as fout:
+        json.dump(params, fout)
@@ -0,0 +1,163 @@
+"""
+    Carla Map Geometry
+"""
+
+import numpy as np
+
+DEG_1_AS_RAD = np.pi / 180
+
+
+class LaneSegment:
+    __slots__ = ('idx', 'road_id', 'points')
+
+    def __init__(self, idx, road_id, points) -> None:
+        self.idx = idx
+        self.road_id = road_id
+        self.points = points  # (N, 3) float64, y already flipped
+
+
+def lateral_shift(locations, pitch, yaw, shift):
+    """
+        Vectorized form of shifting transforms sideways by `shift` meters.
+        locations: (N, 3), pitch/yaw: (N,) degrees, shift: scalar or (N,)
+    """
+    pitch = pitch * DEG_1_AS_RAD
+    yaw = (yaw + 90.0) * DEG_1_AS_RAD
+    cp = np.cos(pitch)
+    right = np.stack((cp * np.cos(yaw), cp * np.sin(yaw), np.sin(pitch)), axis=-1)
+    return locations + np.asarray(shift)[..., None] * right
+
+
+def simplify(points, tolerance):
+    """
+        Douglas-Peucker: drops vertices within `tolerance` meters of the
+        chord between the vertices kept around them. Endpoints always stay.
+    """
+    n = len(points)
+    if n < 3 or not tolerance:
+        return points
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start, chord = points[first], points[last] - points[first]
+        inner = points[first + 1:last] - start
+        length = chord @ chord
+        if length > 0:
+            t = np.clip(inner @ chord / length, 0.0, 1.0)
+            inner = inner - t[:, None] * chord
+        distance = np.einsum('ij,ij->i', inner, inner)
+
+        i = int(np.argmax(distance))
+        if distance[i] > tolerance * tolerance:
+            mid = first + 1 + i
+            keep[mid] = True
+            stack.append((first, mid))
+            stack.append((mid, last))
+
+    return points[keep]
+
+
+class MapGeometry:
+    """
+        Samples every lane of the topology once and keeps the left
+        boundary of each one as a numpy polyline.
+    """
+    def __init__(self, c_map, precision=0.5, cache=None) -> None:
+        self._map = c_map
+        self._precision = precision
+        self._cache = cache
+        self._segments = None
+        self._key = None
+        self.from_cache = False
+
+    @property
+    def key(self):
+        """
+            MapCache key of this map, it changes with the OpenDRIVE content.
+        """
+        if self._key is None:
+            # map_cache imports LaneSegment from this module
+            from scenarios.map_cache import MapCache
+            self._key = MapCache.map_key(self._map, self._precision)
+        return self._key
+
+    @property
+    def segments(self):
+        if self._segments is None:
+            self._segments = self._load()
+        return self._segments
+
+    def load(self):
+        """
+            Materialize the segments, returns True when they came from the cache.
+        """
+        self.segments
+        return self.from_cache
+
+    def _load(self):
+        if self._cache is None:
+            return self._build()
+
+        key = self.key
+        segments = self._cache.load(key)
+        if segments is not None:
+            self.from_cache = True
+            return segments
+
+        segments = self._build()
+        self._cache.save(key, segments)
+        return segments
+
+    def iter_segments(self):
+        if self._segments is not None or self._cache is not None:
+            return iter(self.segments)
+        return self._sample_all()
+
+    def _build(self):
+        return list(self._sample_all())
+
+    def _sample_all(self):
+        visited = set()
+
+        idx = 0
+        for point_pair in self._map.get_topology():
+            for offset, waypoint in ((0, point_pair[0]), (2, point_pair[1])):
+                key = MapGeometry._segment_key(waypoint)
+                if key not in visited:
+                    visited.add(key)
+                    yield self.sample_segment(waypoint, idx + offset)
+            idx += 4
+
+    @staticmethod
+    def _segment_key(waypoint):
+        return (waypoint.road_id, waypoint.section_id, waypoint.lane_id, round(waypoint.s, 2))
+
+    def sample_segment(self, waypoint, idx):
+        road_id = waypoint.road_id
+
+        loc, rot, width = [], [], []
+        while waypoint is not None:
+            transform = waypoint.transform
+            location, rotation = transform.location, transform.rotation
+            loc.append((location.x, location.y, location.z))
+            rot.append((rotation.pitch, rotation.yaw))
+            width.append(waypoint.lane_width)
+
+            next_waypoints = waypoint.next(self._precision)
+            waypoint = next_waypoints[0] if next_waypoints else None
+            if waypoint is not None and waypoint.road_id != road_id:
+                break
+
+        rot = np.asarray(rot, dtype=np.float64)
+        points = lateral_shift(np.asarray(loc, dtype=np.float64),
+                               rot[:, 0], rot[:, 1],
+                               -0.5 * np.asarray(width, dtype=np.float64))
+        points[:, 1] = -points[:, 1]
+
+        return LaneSegment(idx, road_id, points)
@@ -0,0 +1,136 @@
+"""
+    Carla Map Tiles
+
+    Lane geometry split over a fixed grid of square tiles, one GeoJSON file
+    per tile plus index.json, so a viewer only loads the tiles around the ego:
+
+        {directory}/index.json     {"tile_size": s, "tiles": {"tx_ty": {"file", "bounds", "features"}}}
+        {directory}/{tx}_{ty}.json
+
+    Coordinates are those of the exported map, y already flipped.
+"""
+
+import os
+import json
+import math
+from collections import defaultdict
+import numpy as np
+from loguru import logger
+
+from scenarios.map_export import GeoJsonWriter
+from scenarios.process_pool import spawn_pool
+
+INDEX_FILE = 'index.json'
+
+
+def tile_name(tx, ty):
+    return '{}_{}'.format(tx, ty)
+
+
+def split_segment(points, tile_size):
+    """
+        Cuts a polyline into runs of consecutive points in the same tile,
+        returns [((tx, ty), points)]. Every run but the last also takes the
+        first point of the next run, so the pieces stay connected.
+    """
+    tiles = np.floor(points[:, :2] / tile_size).astype(np.int64)
+    change = np.flatnonzero(np.any(tiles[1:] != tiles[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.concatenate((change + 1, [len(points)]))
+    return [(tuple(tiles[start].tolist()), points[start:end]) for start, end in zip(starts, ends)]
+
+
+def _split_group(segments, tile_size):
+    """
+        Pool task: one group of roads, returns {(tx, ty): [(idx, road_id, points)]}.
+    """
+    tiles = defaultdict(list)
+    for idx, road_id, points in segments:
+        for tile, piece in split_segment(points, tile_size):
+            if len(piece) > 1:
+                tiles[tile].append((idx, road_id, piece))
+    return tiles
+
+
+def _write_tile(directory, tile, features, decimals, tolerance):
+    """
+        Pool task: writes one tile file, returns its index entry.
+    """
+    name = tile_name(*tile)
+    with GeoJsonWriter(os.path.join(directory, name + '.json'), decimals=decimals, tolerance=tolerance) as writer:
+        for idx, road_id, points in features:
+            writer.write_feature(idx, road_id, points)
+
+    points = np.concatenate([points for _, _, points in features])
+    bounds = np.concatenate((points[:, :2].min(axis=0), points[:, :2].max(axis=0)))
+    return name, {'file': name + '.json', 'bounds': bounds.tolist(), 'features': writer.count}
+
+
+def write_tiles(segments, directory, tile_size=200.0, decimals=None, tolerance=None, workers=None, groups=None):
+    """
+        Partitions `segments` into tiles on a process pool and writes them
+        with their index. Segments are grouped by road, `groups` batches of
+        roads (4 per worker by default) are split in parallel, then every
+        tile is written by its own task. Returns the index.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    roads = defaultdict(list)
+    for segment in segments:
+        roads[segment.road_id].append((segment.idx, segment.road_id, segment.points))
+
+    workers = workers or os.cpu_count()
+    groups = groups or 4 * workers
+    with spawn_pool(workers) as executor:
+        road_ids = sorted(roads)
+        step = max(1, math.ceil(len(road_ids) / groups))
+        batches = [[s for road_id in road_ids[i:i + step] for s in roads[road_id]]
+                   for i in range(0, len(road_ids), step)]
+
+        tiles = defaultdict(list)
+        for result in executor.map(_split_group, batches, [tile_size] * len(batches)):
+            for tile, features in result.items():
+                tiles[tile].extend(features)
+
+        futures = [executor.submit(_write_tile, directory, tile, features, decimals, tolerance)
+                   for tile, features in tiles.items()]
+        entries = dict(future.result() for future in futures)
+
+    index = {'tile_size': tile_size, 'tiles': entries}
+    with open(os.path.join(directory, INDEX_FILE), 'w') as fout:
+        json.dump(index, fout)
+
+    logger.info('map tiles {} : {} tiles from {} road groups'.format(directory, len(entries), len(batches)))
+    return index
+
+
+class MapTiles:
+    """
+        Reads index.json and loads tiles on demand by position.
+    """
+    def __init__(self, directory) -> None:
+        self._directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as fin:
+            index = json.load(fin)
+        self.tile_size = index['tile_size']
+        self.tiles = index['tiles']
+        self._loaded = {}  # {name: [feature]}
+
+    def tiles_near(self, x, y, radius):
+        """
+            Names of the existing tiles overlapping the square around (x, y).
+        """
+        tx0, tx1 = (math.floor(v / self.tile_size) for v in (x - radius, x + radius))
+        ty0, ty1 = (math.floor(v / self.tile_size) for v in (y - radius, y + radius))
+        return [name for name in (tile_name(tx, ty) for tx in range(tx0, tx1 + 1) for ty in range(ty0, ty1 + 1))
+                if name in self.tiles]
+
+    def load(self, name):
+        features = self._loaded.get(name)
+        if features is None:
+            with open(os.path.join(self._directory, self.tiles[name]['file'])) as fin:
+                features = self._loaded[name] = json.load(fin)['features']
+        return features
+
+    def features_near(self, x, y, radius):
+        return [feature for name in self.tiles_near(x, y, radius) for feature in self.load(name)]
@@ -0,0 +1,163 @@
+"""
+    Pipeline Metrics
+"""
+
+import bisect
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+from loguru import logger
+
+PREFIX = 'carla_xviz'
+
+# seconds, roughly x2 apart from 0.5 ms to 8 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets=LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+            Upper bound of the bucket holding the q-th observation.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+        Per-frame stage tracing and histogram aggregation.
+
+        start(stream, frame, sensor_id) stamps a frame at callback entry,
+        stage(stream, frame, name, sensor_id) records the time since that
+        stamp under stage_latency_seconds{stream, stage}. Stamps are kept
+        per sensor, so cameras sharing a stream do not consume each other's.
+        sensor_id is None for streams without one, e.g. the world.
+    """
+    def __init__(self, max_frames=4096) -> None:
+        self._lock = threading.Lock()
+        self._max_frames = max_frames
+        self._starts = OrderedDict()  # {(stream, sensor_id, frame): monotonic}
+        self._histograms = {}         # {(stream, stage): Histogram}
+        self._collectors = []
+
+    def start(self, stream, frame, sensor_id=None):
+        with self._lock:
+            key = (stream, sensor_id, frame)
+            if key not in self._starts:
+                self._starts[key] = monotonic()
+                if len(self._starts) > self._max_frames:
+                    self._starts.popitem(last=False)
+
+    def stage(self, stream, frame, name, sensor_id=None, done=False):
+        now = monotonic()
+        key = (stream, sensor_id, frame)
+        with self._lock:
+            start = self._starts.pop(key, None) if done else self._starts.get(key)
+            if start is None:
+                return
+            histogram = self._histograms.get((stream, name))
+            if histogram is None:
+                histogram = self._histograms[(stream, name)] = Histogram()
+            histogram.observe(now - start)
+
+    def add_collector(self, collector):
+        """
+            collector() returns a (nested) dict of numbers exported as gauges.
+        """
+        self._collectors.append(collector)
+
+    def summary(self):
+        with self._lock:
+            return {'{}/{}'.format(stream, name): {'count': h.count,
+                                                   'p50': h.quantile(0.5),
+                                                   'p99': h.quantile(0.99)}
+                    for (stream, name), h in self._histograms.items()}
+
+    def render(self):
+        lines = []
+        with self._lock:
+            name = PREFIX + '_stage_latency_seconds'
+            lines.append('# TYPE {} histogram'.format(name))
+            for (stream, stage), h in sorted(self._histograms.items()):
+                labels = 'stream="{}",stage="{}"'.format(stream, stage)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+                lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, h.count))
+                lines.append('{}_sum{{{}}} {}'.format(name, labels, h.sum))
+                lines.append('{}_count{{{}}} {}'.format(name, labels, h.count))
+
+        for collector in self._collectors:
+            try:
+                Metrics._flatten(collector(), PREFIX, lines)
+            except Exception as e:
+                logger.info('metrics collector failed : {}'.format(e))
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _flatten(value, name, lines):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                Metrics._flatten(v, '{}_{}'.format(name, k), lines)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append('{} {}'.format(name, value))
+
+
+metrics = Metrics()
+
+
+class MetricsServer:
+    """
+        Serves metrics.render() as Prometheus text on http://host:port/metrics.
+    """
+    def __init__(self, port=9108, host='127.0.0.1', registry=metrics) -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info('metrics on http://{}:{}/metrics'.format(*self._server.server_address[:2]))
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
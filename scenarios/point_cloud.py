@@ -0,0 +1,82 @@
+"""
+    Carla Point Cloud
+"""
+
+import numpy as np
+
+
+class PointCloud:
+    __slots__ = ('stream', 'frame', 'points')
+
+    def __init__(self, stream, frame, points) -> None:
+        self.stream = stream
+        self.frame = frame
+        self.points = points  # (N, 3) float32, world coordinates with y flipped
+
+
+def decode_lidar(measurement):
+    """
+        (N, 4) float32 view of x, y, z, intensity over raw_data, no copy.
+    """
+    return np.frombuffer(measurement.raw_data, dtype=np.float32).reshape((-1, 4))
+
+
+def decode_radar(measurement):
+    """
+        (N, 4) float32 view of velocity, azimuth, altitude, depth over raw_data, no copy.
+    """
+    return np.frombuffer(measurement.raw_data, dtype=np.float32).reshape((-1, 4))
+
+
+def radar_to_points(detections):
+    _, azimuth, altitude, depth = detections.T
+    cos_alt = np.cos(altitude)
+    return np.stack((depth * cos_alt * np.cos(azimuth),
+                     depth * cos_alt * np.sin(azimuth),
+                     depth * np.sin(altitude)), axis=-1).astype(np.float32)
+
+
+def to_world(points, transform):
+    """
+        Sensor frame (N, 3) to world, y flipped like the map.
+    """
+    matrix = np.asarray(transform.get_matrix(), dtype=np.float32)
+    world = points @ matrix[:3, :3].T + matrix[:3, 3]
+    world[:, 1] = -world[:, 1]
+    return world
+
+
+class PointCloudFilter:
+    """
+        Optional crop and voxel-grid downsampling in the sensor frame.
+
+        max_range: drop points further than this from the sensor (meters)
+        z_range:   (min, max) kept height relative to the sensor
+        voxel_size: keep one point per cubic voxel of this edge length
+    """
+    def __init__(self, max_range=None, z_range=None, voxel_size=None) -> None:
+        self._max_range = max_range
+        self._z_range = z_range
+        self._voxel_size = voxel_size
+
+    def apply(self, points):
+        xyz = points[:, :3]
+
+        mask = None
+        if self._max_range is not None:
+            mask = np.einsum('ij,ij->i', xyz, xyz) <= self._max_range * self._max_range
+        if self._z_range is not None:
+            z_mask = (xyz[:, 2] >= self._z_range[0]) & (xyz[:, 2] <= self._z_range[1])
+            mask = z_mask if mask is None else mask & z_mask
+        if mask is not None:
+            xyz = xyz[mask]
+
+        if self._voxel_size and len(xyz):
+            voxels = np.floor(xyz / self._voxel_size).astype(np.int64)
+            # pack the three voxel indices into one key, 21 bits each
+            voxels -= voxels.min(axis=0)
+            keys = (voxels[:, 0] << 42) | (voxels[:, 1] << 21) | voxels[:, 2]
+            _, first = np.unique(keys, return_index=True)
+            xyz = xyz[first]
+
+        return xyz
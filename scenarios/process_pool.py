@@ -0,0 +1,16 @@
+"""
+    Process Pools
+"""
+
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+
+def spawn_pool(max_workers=None):
+    """
+        ProcessPoolExecutor with spawned workers. Forking once the carla
+        client threads are running can deadlock a worker on a lock some
+        thread held at fork time. Spawned workers import the main module as
+        __mp_main__, so it must not do any work at import.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context('spawn'))
@@ -0,0 +1,169 @@
+"""
+    Carla Recording
+
+    A recording is a directory of flat files that can be memory-mapped:
+        meta.json    map name, static actor data, sensor types
+        map.xodr     OpenDRIVE of the recorded map
+        ticks.bin    TICK_DTYPE, one row per world tick
+        actors.bin   ACTOR_DTYPE, ticks.bin rows point at their slice
+        sensors.bin  SENSOR_DTYPE, one row per sensor measurement
+        blobs.bin    raw_data of the measurements back to back
+"""
+
+import os
+import json
+import threading
+import numpy as np
+from loguru import logger
+
+TICK_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('elapsed', '<f8'),
+    ('delta', '<f8'),
+    ('start', '<i8'),
+    ('count', '<i8'),
+])
+
+ACTOR_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('location', '<f4', 3),
+    ('rotation', '<f4', 3),   # pitch, yaw, roll as carla.Rotation takes them
+    ('velocity', '<f4', 3),
+    ('acceleration', '<f4', 3),
+    ('light_state', '<i1'),   # int(carla.TrafficLightState), -1 for other actors
+])
+
+SENSOR_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('frame', '<i8'),
+    ('elapsed', '<f8'),
+    ('offset', '<i8'),
+    ('size', '<i8'),
+    ('width', '<i4'),
+    ('height', '<i4'),
+    ('location', '<f4', 3),
+    ('rotation', '<f4', 3),
+])
+
+FILES = ('ticks.bin', 'actors.bin', 'sensors.bin', 'blobs.bin')
+
+
+def _vector(v):
+    return (v.x, v.y, v.z)
+
+
+def _box(box):
+    return {'location': _vector(box.location), 'extent': _vector(box.extent)}
+
+
+def _raw_buffer(data):
+    if hasattr(data, 'raw_data'):
+        return memoryview(data.raw_data)
+    # carla.IMUMeasurement has no raw_data, store its 7 floats
+    return np.array(_vector(data.accelerometer) + _vector(data.gyroscope) + (data.compass,),
+                    dtype=np.float32).data
+
+
+class Recorder:
+    """
+        Appends ticks, actor states and raw sensor buffers of a live session
+        to `path`. CarlaScenario calls record_tick() from process_snapshot and
+        record_sensor() from every sensor callback.
+    """
+    def __init__(self, path, c_map) -> None:
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._lock = threading.Lock()
+        self._files = {name: open(os.path.join(path, name), 'wb') for name in FILES}
+        self._actor_rows = 0
+        self._blob_offset = 0
+
+        self._meta = {'map': c_map.name, 'actors': {}, 'sensors': {}}
+        with open(os.path.join(path, 'map.xodr'), 'w') as fout:
+            fout.write(c_map.to_opendrive())
+
+        self.ticks = 0
+        self.measurements = 0
+
+    def record_actors(self, infos):
+        for info in infos:
+            actor = info.actor
+            entry = {
+                'type_id': info.type_id,
+                'attributes': info.attributes,
+                'bounding_box': {'location': info.bbox_location, 'extent': info.extent},
+            }
+            if info.type_id.startswith('traffic.traffic_light'):
+                entry['trigger_volume'] = _box(actor.trigger_volume)
+            self._meta['actors'][str(info.id)] = entry
+
+    def record_tick(self, snapshots, registry):
+        self.record_actors([info for info in registry.values() if str(info.id) not in self._meta['actors']])
+
+        rows = np.zeros(len(snapshots), dtype=ACTOR_DTYPE)
+        for i, actor_snapshot in enumerate(snapshots):
+            transform = actor_snapshot.get_transform()
+            rotation = transform.rotation
+            rows[i] = (actor_snapshot.id,
+                       _vector(transform.location),
+                       (rotation.pitch, rotation.yaw, rotation.roll),
+                       _vector(actor_snapshot.get_velocity()),
+                       _vector(actor_snapshot.get_acceleration()),
+                       -1)
+            info = registry.get(actor_snapshot.id)
+            if info is not None and info.type_id.startswith('traffic.traffic_light'):
+                rows[i]['light_state'] = int(info.actor.state)
+
+        timestamp = snapshots.timestamp
+        tick = np.array([(snapshots.frame, timestamp.elapsed_seconds, timestamp.delta_seconds,
+                          self._actor_rows, len(rows))], dtype=TICK_DTYPE)
+        with self._lock:
+            self._files['actors.bin'].write(rows.tobytes())
+            self._files['ticks.bin'].write(tick.tobytes())
+            self._actor_rows += len(rows)
+            self.ticks += 1
+
+    def record_sensor(self, sensor_id, type_id, data):
+        buffer = _raw_buffer(data)
+        transform = data.transform
+        with self._lock:
+            self._meta['sensors'][str(sensor_id)] = type_id
+            row = np.array([(sensor_id, data.frame, data.timestamp, self._blob_offset, buffer.nbytes,
+                             getattr(data, 'width', 0), getattr(data, 'height', 0),
+                             _vector(transform.location),
+                             (transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll))],
+                           dtype=SENSOR_DTYPE)
+            self._files['blobs.bin'].write(buffer)
+            self._files['sensors.bin'].write(row.tobytes())
+            self._blob_offset += buffer.nbytes
+            self.measurements += 1
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            with open(os.path.join(self._path, 'meta.json'), 'w') as fout:
+                json.dump(self._meta, fout)
+        logger.info('recording {} : {} ticks, {} measurements'.format(self._path, self.ticks, self.measurements))
+
+
+def load(path):
+    """
+        Memory-maps a recording, returns (meta, xodr, ticks, actors, sensors, blobs).
+    """
+    def memmap(name, dtype):
+        file = os.path.join(path, name)
+        if os.path.getsize(file) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file, dtype=dtype, mode='r')
+
+    with open(os.path.join(path, 'meta.json')) as fin:
+        meta = json.load(fin)
+    with open(os.path.join(path, 'map.xodr')) as fin:
+        xodr = fin.read()
+
+    return (meta, xodr,
+            memmap('ticks.bin', TICK_DTYPE),
+            memmap('actors.bin', ACTOR_DTYPE),
+            memmap('sensors.bin', SENSOR_DTYPE),
+            memmap('blobs.bin', np.uint8))
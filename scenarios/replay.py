@@ -0,0 +1,260 @@
+"""
+    Carla Replay
+
+    Stand-in for carla.Client that plays a recording back through the same
+    calls CarlaScenario makes on a live server. Only the carla python
+    package is needed, no simulator.
+"""
+
+import fnmatch
+from time import monotonic, sleep
+import carla
+import numpy as np
+from loguru import logger
+
+from scenarios import recording
+
+
+class ReplayFinished(RuntimeError):
+    pass
+
+
+def _transform(location, rotation):
+    return carla.Transform(carla.Location(*map(float, location)),
+                           carla.Rotation(*map(float, rotation)))
+
+
+def _box(entry):
+    return carla.BoundingBox(carla.Location(*entry['location']), carla.Vector3D(*entry['extent']))
+
+
+class ReplayTimestamp:
+    __slots__ = ('frame', 'elapsed_seconds', 'delta_seconds')
+
+    def __init__(self, frame, elapsed_seconds, delta_seconds) -> None:
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+
+
+class ReplayActorSnapshot:
+    __slots__ = ('id', '_row')
+
+    def __init__(self, row) -> None:
+        self.id = int(row['id'])
+        self._row = row
+
+    def get_transform(self):
+        return _transform(self._row['location'], self._row['rotation'])
+
+    def get_velocity(self):
+        return carla.Vector3D(*map(float, self._row['velocity']))
+
+    def get_acceleration(self):
+        return carla.Vector3D(*map(float, self._row['acceleration']))
+
+
+class ReplayWorldSnapshot:
+    def __init__(self, tick, rows) -> None:
+        self.frame = int(tick['frame'])
+        self.timestamp = ReplayTimestamp(self.frame, float(tick['elapsed']), float(tick['delta']))
+        self._rows = rows
+        self._ids = {int(id): i for i, id in enumerate(rows['id'])}
+
+    def __iter__(self):
+        return (ReplayActorSnapshot(row) for row in self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def find(self, id):
+        i = self._ids.get(id)
+        return None if i is None else ReplayActorSnapshot(self._rows[i])
+
+    def has_actor(self, id):
+        return id in self._ids
+
+
+class ReplayMeasurement:
+    """
+        Sensor data with raw_data as a zero-copy view into blobs.bin.
+    """
+    def __init__(self, row, blobs) -> None:
+        self.frame = int(row['frame'])
+        self.timestamp = float(row['elapsed'])
+        self.width = int(row['width'])
+        self.height = int(row['height'])
+        self.transform = _transform(row['location'], row['rotation'])
+        self.raw_data = blobs[row['offset']:row['offset'] + row['size']]
+
+
+class ReplayIMUMeasurement(ReplayMeasurement):
+    def __init__(self, row, blobs) -> None:
+        super().__init__(row, blobs)
+        values = self.raw_data.view(np.float32)
+        self.accelerometer = carla.Vector3D(*map(float, values[0:3]))
+        self.gyroscope = carla.Vector3D(*map(float, values[3:6]))
+        self.compass = float(values[6])
+
+
+class ReplayActor:
+    def __init__(self, world, id, entry) -> None:
+        self._world = world
+        self.id = id
+        self.type_id = entry['type_id']
+        self.attributes = entry['attributes']
+        self.bounding_box = _box(entry['bounding_box'])
+        if 'trigger_volume' in entry:
+            self.trigger_volume = _box(entry['trigger_volume'])
+        self._callback = None
+
+    def _row(self):
+        snapshot = self._world.get_snapshot()
+        return snapshot._rows[snapshot._ids[self.id]]
+
+    def get_world(self):
+        return self._world
+
+    def get_transform(self):
+        row = self._row()
+        return _transform(row['location'], row['rotation'])
+
+    def get_velocity(self):
+        return carla.Vector3D(*map(float, self._row()['velocity']))
+
+    def get_acceleration(self):
+        return carla.Vector3D(*map(float, self._row()['acceleration']))
+
+    @property
+    def state(self):
+        return carla.TrafficLightState.values[int(self._row()['light_state'])]
+
+    def listen(self, callback):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def is_listening(self):
+        return self._callback is not None
+
+
+class ReplayActorList(list):
+    def filter(self, pattern):
+        return ReplayActorList(a for a in self if fnmatch.fnmatch(a.type_id, pattern))
+
+    def find(self, id):
+        for actor in self:
+            if actor.id == id:
+                return actor
+        return None
+
+
+class ReplaySettings:
+    def __init__(self) -> None:
+        self.synchronous_mode = False
+        self.fixed_delta_seconds = None
+
+
+class ReplayWorld:
+    """
+        speed: playback rate against the recorded timestamps,
+               None or 0 replays as fast as the consumer allows
+        loop:  start over at the end instead of raising ReplayFinished
+    """
+    def __init__(self, path, speed=1.0, loop=False) -> None:
+        meta, xodr, self._ticks, self._actor_rows, sensors, self._blobs = recording.load(path)
+        self._map = carla.Map(meta['map'], xodr)
+        self._speed = speed
+        self._loop = loop
+
+        self._actors = {int(id): ReplayActor(self, int(id), entry) for id, entry in meta['actors'].items()}
+        self._sensor_types = {int(id): type_id for id, type_id in meta['sensors'].items()}
+
+        # sensor rows grouped by frame
+        order = np.argsort(sensors['frame'], kind='stable')
+        self._sensors = sensors[order]
+        self._sensor_frames = self._sensors['frame']
+
+        self._settings = ReplaySettings()
+        self._index = 0
+        self._snapshot = self._load_tick(0)
+        self._wall_start = None
+        self._sim_start = None
+        logger.info('replay {} : {} ticks, {} measurements'.format(path, len(self._ticks), len(self._sensors)))
+
+    def _load_tick(self, index):
+        tick = self._ticks[index]
+        rows = self._actor_rows[tick['start']:tick['start'] + tick['count']]
+        return ReplayWorldSnapshot(tick, rows)
+
+    def get_map(self):
+        return self._map
+
+    def get_settings(self):
+        return self._settings
+
+    def apply_settings(self, settings):
+        self._settings = settings
+        return self._snapshot.frame
+
+    def get_snapshot(self):
+        return self._snapshot
+
+    def get_actor(self, id):
+        return self._actors.get(id)
+
+    def get_actors(self, actor_ids=None):
+        if actor_ids is None:
+            return ReplayActorList(a for id, a in self._actors.items() if self._snapshot.has_actor(id))
+        return ReplayActorList(self._actors[id] for id in actor_ids if id in self._actors)
+
+    def tick(self, seconds=10.0):
+        return self.wait_for_tick(seconds).frame
+
+    def wait_for_tick(self, seconds=10.0):
+        if self._index + 1 >= len(self._ticks):
+            if not self._loop:
+                raise ReplayFinished('replay finished after {} ticks'.format(len(self._ticks)))
+            self._index = -1
+            self._wall_start = None
+
+        self._index += 1
+        self._snapshot = self._load_tick(self._index)
+        self._pace()
+        self._dispatch(self._snapshot.frame)
+        return self._snapshot
+
+    def _pace(self):
+        now = monotonic()
+        if self._wall_start is None:
+            self._wall_start, self._sim_start = now, self._snapshot.timestamp.elapsed_seconds
+            return
+        if self._speed:
+            target = (self._snapshot.timestamp.elapsed_seconds - self._sim_start) / self._speed
+            ahead = target - (now - self._wall_start)
+            if ahead > 0:
+                sleep(ahead)
+
+    def _dispatch(self, frame):
+        lo = np.searchsorted(self._sensor_frames, frame, side='left')
+        hi = np.searchsorted(self._sensor_frames, frame, side='right')
+        for row in self._sensors[lo:hi]:
+            actor = self._actors.get(int(row['id']))
+            if actor is None or actor._callback is None:
+                continue
+            if self._sensor_types.get(actor.id) == 'sensor.other.imu':
+                actor._callback(ReplayIMUMeasurement(row, self._blobs))
+            else:
+                actor._callback(ReplayMeasurement(row, self._blobs))
+
+
+class ReplayClient:
+    def __init__(self, path, speed=1.0, loop=False) -> None:
+        self._world = ReplayWorld(path, speed, loop)
+
+    def set_timeout(self, seconds):
+        pass
+
+    def get_world(self):
+        return self._world
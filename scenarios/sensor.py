@@ -1,7 +1,72 @@
-import carla
+import threading
+import numpy as np
+
+EGO_FIELDS = ('time', 'vx', 'vy', 'vz', 'ax', 'ay', 'az')
+IMU_FIELDS = ('time', 'accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z', 'compass')
+
+# vector fields for SampleColumns.magnitude()
+EGO_VELOCITY = ('vx', 'vy', 'vz')
+EGO_ACCELERATION = ('ax', 'ay', 'az')
+IMU_ACCELEROMETER = ('accel_x', 'accel_y', 'accel_z')
+IMU_GYROSCOPE = ('gyro_x', 'gyro_y', 'gyro_z')
+
 
 class CarlaImage:
     def __init__(self, id, frame_id, data) -> None:
         self._id = id
         self._frame_id = frame_id
-        self._data = data
\ No newline at end of file
+        self._data = data
+
+
+class SampleColumns:
+    """
+        Last `capacity` scalar samples of one stream, stored column-wise in
+        preallocated arrays: a frame column and one float64 column per field.
+        append() allocates nothing per sample, history comes back as NumPy
+        arrays in frame order.
+    """
+    def __init__(self, fields, capacity=4096) -> None:
+        self.fields = fields
+        self.capacity = capacity
+        self._index = {name: i for i, name in enumerate(fields)}
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, len(fields)), dtype=np.float64)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, frame, *values):
+        with self._lock:
+            i = self.count % self.capacity
+            self._frames[i] = frame
+            self._values[i] = values
+            self.count += 1
+
+    def last(self, n=None):
+        """
+            (frames, values) of the newest n samples, oldest first, as copies.
+        """
+        with self._lock:
+            size = min(self.count, self.capacity)
+            n = size if n is None else min(n, size)
+            order = np.arange(self.count - n, self.count) % self.capacity
+            return self._frames[order], self._values[order]
+
+    def column(self, name, n=None):
+        return self.last(n)[1][:, self._index[name]]
+
+    def magnitude(self, names, n=None):
+        """
+            Euclidean norm over the `names` columns of the newest n samples.
+        """
+        values = self.last(n)[1][:, [self._index[name] for name in names]]
+        return np.sqrt(np.einsum('ij,ij->i', values, values))
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'capacity': self.capacity,
+            'count': self.count,
+        }
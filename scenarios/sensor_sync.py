@@ -0,0 +1,171 @@
+"""
+    Carla Sensor Synchronization
+"""
+
+import threading
+from collections import OrderedDict
+from queue import Empty
+from time import monotonic
+
+from scenarios.bounded_queue import BoundedQueue, DROP_OLDEST, BLOCK
+
+
+class FrameAggregator:
+    """
+        Collects {frame: {sensor_id: data}} from the sensor callbacks and
+        hands out one bundle per frame, in frame order.
+
+        A frame is emitted when every registered sensor has reported or
+        `timeout` seconds after its first sample arrived. At most `capacity`
+        frames are pending at once, the oldest are evicted beyond that.
+        Emitted bundles wait in a BoundedQueue of `ready_size` handled
+        with `ready_policy`.
+    """
+    def __init__(self, capacity=32, timeout=0.5, ready_size=8, ready_policy=DROP_OLDEST) -> None:
+        self._capacity = capacity
+        self._timeout = timeout
+
+        self._cond = threading.Condition()
+        self._sensors = set()
+        self._pending = OrderedDict()  # {frame: {sensor_id: data}}
+        self._arrival = {}             # {frame: monotonic time of first sample}
+        self._ready = BoundedQueue(ready_size, ready_policy)  # (frame, {sensor_id: data})
+        self._last_frame = -1
+
+        self.emitted = 0
+        self.incomplete = 0
+        self.evicted = 0
+        self.late = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def register(self, sensor_id):
+        with self._cond:
+            self._sensors.add(sensor_id)
+
+    def unregister(self, sensor_id):
+        with self._cond:
+            self._sensors.discard(sensor_id)
+
+    def reset(self):
+        """
+            Forgets pending and ready frames and the last emitted frame, e.g.
+            after a server restart when frame numbers start over.
+        """
+        with self._cond:
+            self._pending.clear()
+            self._arrival.clear()
+            while True:
+                try:
+                    self._ready.get_nowait()
+                except Empty:
+                    break
+            self._last_frame = -1
+            self._cond.notify_all()
+
+    def put(self, frame, sensor_id, data):
+        with self._cond:
+            if frame <= self._last_frame:
+                self.late += 1
+                return
+
+            sensors = self._pending.get(frame)
+            if sensors is None:
+                out_of_order = self._pending and frame < next(reversed(self._pending))
+                sensors = self._pending[frame] = {}
+                self._arrival[frame] = monotonic()
+                if out_of_order:
+                    self._pending = OrderedDict(sorted(self._pending.items()))
+            sensors[sensor_id] = data
+
+            # each sensor streams in frame order, so once `frame` is complete
+            # none of the older pending frames can complete any more
+            if self._sensors.issubset(sensors):
+                self._emit_until(frame)
+
+            while len(self._pending) > self._capacity:
+                self._evict_oldest()
+
+            self._expire()
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+            Returns (frame, {sensor_id: data}) or None when nothing became
+            ready within `timeout` seconds.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            # taken outside of _cond so a producer blocked on a full
+            # ready queue (BLOCK policy) can always be released
+            try:
+                return self._ready.get_nowait()
+            except Empty:
+                pass
+
+            with self._cond:
+                self._expire(block=False)
+                if not self._ready.empty():
+                    continue
+
+                wait = self._timeout
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'ready': self._ready.stats(),
+                'emitted': self.emitted,
+                'incomplete': self.incomplete,
+                'evicted': self.evicted,
+                'late': self.late,
+                'latency_avg': self._latency_sum / self.emitted if self.emitted else 0.0,
+                'latency_max': self._latency_max,
+            }
+
+    def _emit_until(self, frame):
+        while self._pending:
+            oldest = next(iter(self._pending))
+            if oldest > frame:
+                break
+            self._emit_oldest()
+
+    def _emit_oldest(self):
+        frame, sensors = self._pending.popitem(last=False)
+        latency = monotonic() - self._arrival.pop(frame)
+
+        if not self._sensors.issubset(sensors):
+            self.incomplete += 1
+        self.emitted += 1
+        self._latency_sum += latency
+        self._latency_max = max(self._latency_max, latency)
+        self._last_frame = frame
+
+        self._ready.put((frame, sensors))
+
+    def _evict_oldest(self):
+        frame, _ = self._pending.popitem(last=False)
+        self._arrival.pop(frame)
+        self._last_frame = max(self._last_frame, frame)
+        self.evicted += 1
+
+    def _expire(self, block=True):
+        """
+            block=False is the consumer's side: it must not wait on the ready
+            queue it drains itself, so with BLOCK expired frames beyond a
+            full queue stay pending until the next get().
+        """
+        now = monotonic()
+        while self._pending:
+            oldest = next(iter(self._pending))
+            if now - self._arrival[oldest] < self._timeout:
+                break
+            if not block and self._ready.policy == BLOCK and self._ready.full():
+                break
+            self._emit_oldest()
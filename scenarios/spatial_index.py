@@ -0,0 +1,116 @@
+"""
+    Carla Spatial Index
+"""
+
+import numpy as np
+from loguru import logger
+
+_CELL_OFFSET = 1 << 20
+
+
+class GridIndex:
+    """
+        Uniform 2D grid over points, stored as one array sorted by cell key.
+        Every point carries an owner id (lane segment, actor id, ...) and
+        queries return the owners with at least one point in range.
+    """
+    def __init__(self, points, owners, cell_size=20.0) -> None:
+        self._cell_size = cell_size
+
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 3))
+        owners = np.asarray(owners)
+        keys = self._keys(points[:, 0], points[:, 1])
+        order = np.argsort(keys, kind='stable')
+
+        self._keys_sorted = keys[order]
+        self._xy = np.ascontiguousarray(points[order, :2])
+        self._owners = owners[order]
+
+    def __len__(self):
+        return len(self._owners)
+
+    def _cells(self, v):
+        return np.floor(np.asarray(v) / self._cell_size).astype(np.int64) + _CELL_OFFSET
+
+    def _keys(self, x, y):
+        return (self._cells(x) << 21) | self._cells(y)
+
+    def query(self, x, y, radius):
+        if not len(self._owners):
+            return self._owners[:0]
+
+        cx0, cx1 = self._cells([x - radius, x + radius])
+        cy0, cy1 = self._cells([y - radius, y + radius])
+        cx, cy = np.meshgrid(np.arange(cx0, cx1 + 1), np.arange(cy0, cy1 + 1))
+        keys = ((cx << 21) | cy).ravel()
+
+        lo = np.searchsorted(self._keys_sorted, keys, side='left')
+        hi = np.searchsorted(self._keys_sorted, keys, side='right')
+        hit = hi > lo
+        if not hit.any():
+            return self._owners[:0]
+
+        candidates = np.concatenate([np.arange(l, h) for l, h in zip(lo[hit], hi[hit])])
+        d = self._xy[candidates] - (x, y)
+        inside = candidates[np.einsum('ij,ij->i', d, d) <= radius * radius]
+        return np.unique(self._owners[inside])
+
+
+def _locations(world, pattern):
+    result = {}
+    for actor in world.get_actors().filter(pattern):
+        location = actor.get_transform().location
+        result[actor.id] = (location.x, -location.y, location.z)
+    return result
+
+
+class MapIndex:
+    """
+        Lane polylines, traffic lights and stop signs of one map, indexed in
+        the y flipped frame used for the XVIZ output.
+    """
+    def __init__(self, segments, traffic_lights, stop_signs, cell_size=20.0) -> None:
+        self.segments = segments
+        self._cell_size = cell_size
+
+        if segments:
+            points = np.concatenate([s.points for s in segments])
+            owners = np.repeat(np.arange(len(segments)), [len(s.points) for s in segments])
+        else:
+            points, owners = np.zeros((0, 3)), np.zeros(0, dtype=np.int64)
+        self._lanes = GridIndex(points, owners, cell_size)
+        self._set_actors(traffic_lights, stop_signs)
+
+    @staticmethod
+    def build(map_geometry, world, cell_size=20.0):
+        index = MapIndex(map_geometry.segments,
+                         _locations(world, 'traffic.traffic_light*'),
+                         _locations(world, 'traffic.stop'),
+                         cell_size)
+        logger.info('map index {} lanes, {} traffic lights, {} stop signs'.format(
+            len(index.segments), len(index.traffic_lights), len(index.stop_signs)))
+        return index
+
+    def rebind(self, world):
+        """
+            Indexes the traffic lights and stop signs of a new episode again,
+            their actor ids change with it. The lane grid is kept.
+        """
+        self._set_actors(_locations(world, 'traffic.traffic_light*'), _locations(world, 'traffic.stop'))
+        logger.info('map index rebound {} traffic lights, {} stop signs'.format(
+            len(self.traffic_lights), len(self.stop_signs)))
+
+    def _set_actors(self, traffic_lights, stop_signs):
+        self.traffic_lights = traffic_lights  # {id: (x, y, z)}
+        self.stop_signs = stop_signs          # {id: (x, y, z)}
+        self._lights = GridIndex(list(traffic_lights.values()), list(traffic_lights.keys()), self._cell_size)
+        self._stops = GridIndex(list(stop_signs.values()), list(stop_signs.keys()), self._cell_size)
+
+    def lanes_near(self, x, y, radius):
+        return [self.segments[i] for i in self._lanes.query(x, y, radius)]
+
+    def traffic_lights_near(self, x, y, radius):
+        return self._lights.query(x, y, radius).tolist()
+
+    def stop_signs_near(self, x, y, radius):
+        return self._stops.query(x, y, radius).tolist()
@@ -0,0 +1,191 @@
+"""
+    Carla Telemetry
+
+    Ego telemetry written into shared memory ring buffers and plotted by a
+    separate process, so drawing never runs on the ingest threads.
+"""
+
+import os
+import sys
+import json
+import math
+import subprocess
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from loguru import logger
+
+# {ring: columns}, the first column is the time axis
+CHANNELS = {
+    'ego': ('time', 'speed', 'acceleration'),
+    'imu': ('time', 'accelerometer', 'gyroscope'),
+}
+
+
+class TelemetryRing:
+    """
+        Fixed size float64 ring over shared memory with a single writer.
+
+        The header holds the number of rows ever written, bumped after the
+        row is complete, and a closed flag. read() copies rows below the
+        count it saw and leaves out the slot the writer fills next.
+    """
+    HEADER = 16  # int64 write count, int64 closed
+
+    def __init__(self, columns, capacity=4096, name=None) -> None:
+        self.columns = columns
+        self.capacity = capacity
+        size = self.HEADER + capacity * len(columns) * 8
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+            # the plot process has its own resource tracker, which would
+            # unlink the segment when it exits
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=self._shm.buf)
+        self._rows = np.ndarray((capacity, len(columns)), dtype=np.float64, buffer=self._shm.buf, offset=self.HEADER)
+        if self._owner:
+            self._header[:] = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def closed(self):
+        return bool(self._header[1])
+
+    def write(self, *values):
+        count = int(self._header[0])
+        self._rows[count % self.capacity] = values
+        self._header[0] = count + 1
+
+    def read(self, since):
+        """
+            Rows written after `since`, returns (rows copy, new since).
+        """
+        count = int(self._header[0])
+        start = max(since, count - self.capacity + 1)
+        if start >= count:
+            return self._rows[:0].copy(), count
+        return self._rows[np.arange(start, count) % self.capacity], count
+
+    def close(self):
+        if self._owner:
+            self._header[1] = 1
+        del self._header, self._rows
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class TelemetryWindow:
+    """
+        Last `window` seconds of one ring, decimated to at most `max_points`
+        per line when drawn.
+    """
+    def __init__(self, columns, window, max_points) -> None:
+        self.window = window
+        self.max_points = max_points
+        self.rows = np.zeros((0, len(columns)))
+
+    def extend(self, rows):
+        if not len(rows):
+            return False
+        self.rows = np.concatenate((self.rows, rows))
+        self.rows = self.rows[self.rows[:, 0] >= self.rows[-1, 0] - self.window]
+        return True
+
+    def decimated(self):
+        step = max(1, math.ceil(len(self.rows) / self.max_points))
+        return self.rows[::step]
+
+
+def _plot_main(rings, window, max_points, interval, parent):
+    import matplotlib.pyplot as plt
+
+    try:
+        rings = {key: TelemetryRing(columns, capacity, name) for key, (columns, capacity, name) in rings.items()}
+    except FileNotFoundError:
+        return  # the session closed before the plot came up
+    windows = {key: TelemetryWindow(ring.columns, window, max_points) for key, ring in rings.items()}
+    since = dict.fromkeys(rings, 0)
+
+    plt.ion()
+    fig, axes = plt.subplots(len(rings), 1, figsize=(12, 3.5 * len(rings)), squeeze=False)
+    lines = {}
+    for ax, (key, ring) in zip(axes[:, 0], rings.items()):
+        ax.set_title(key)
+        ax.set_xlabel(ring.columns[0])
+        lines[key] = [ax.plot([], [], label=column)[0] for column in ring.columns[1:]]
+        ax.legend(loc='upper left')
+
+    try:
+        while (plt.fignum_exists(fig.number) and os.getppid() == parent
+               and not any(ring.closed for ring in rings.values())):
+            for ax, key in zip(axes[:, 0], rings):
+                rows, since[key] = rings[key].read(since[key])
+                if not windows[key].extend(rows):
+                    continue
+                # only the line data changes, the figure is never cleared
+                data = windows[key].decimated()
+                for i, line in enumerate(lines[key], start=1):
+                    line.set_data(data[:, 0], data[:, i])
+                ax.relim()
+                ax.autoscale_view()
+            fig.canvas.draw_idle()
+            plt.pause(interval)
+    finally:
+        plt.close(fig)
+        for ring in rings.values():
+            ring.close()
+
+
+class TelemetryPlotter:
+    """
+        Owns the rings and the plotting process. write(ring, *values) is a
+        single row copy into shared memory and the only cost the caller pays.
+
+        The plot runs as `python -m scenarios.telemetry`, a fresh interpreter
+        that neither re-imports main.py nor inherits the carla threads.
+
+        window:     seconds of history on screen
+        max_points: points per line after decimation
+        interval:   seconds between redraws
+    """
+    def __init__(self, channels=CHANNELS, capacity=4096, window=30.0, max_points=500, interval=0.1) -> None:
+        self._rings = {key: TelemetryRing(columns, capacity) for key, columns in channels.items()}
+        self._args = {
+            'rings': {key: (ring.columns, ring.capacity, ring.name) for key, ring in self._rings.items()},
+            'window': window,
+            'max_points': max_points,
+            'interval': interval,
+            'parent': os.getpid(),
+        }
+        self._process = None
+
+    def start(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._process = subprocess.Popen([sys.executable, '-m', 'scenarios.telemetry', json.dumps(self._args)],
+                                         cwd=root)
+        logger.info('telemetry plot pid {}'.format(self._process.pid))
+        return self
+
+    def write(self, ring, *values):
+        self._rings[ring].write(*values)
+
+    def close(self):
+        for ring in self._rings.values():
+            ring.close()
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self._process.terminate()
+
+
+if __name__ == '__main__':
+    _plot_main(**json.loads(sys.argv[1]))
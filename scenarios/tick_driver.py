@@ -0,0 +1,112 @@
+"""
+    Carla Synchronous Tick Driver
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from loguru import logger
+
+
+class SyncTickDriver:
+    """
+        Runs the world in synchronous mode and pipelines it: while the
+        server simulates tick N+1, tick N is processed on a worker thread.
+        Up to `depth` ticks are processed during a world.tick(), the oldest
+        is waited for beyond that, so no frame is ever skipped.
+    """
+    def __init__(self, scenario, fixed_delta=0.05, depth=2, tick_timeout=10.0, report_every=200) -> None:
+        self._scenario = scenario
+        self._fixed_delta = fixed_delta
+        self._depth = max(1, depth)
+        self._tick_timeout = tick_timeout
+        self._report_every = report_every
+
+        self._settings = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tick_process')
+        self._in_flight = deque()
+
+        self.ticks = 0
+        self._wall_start = None
+        self._sim_start = None
+        self._sim_time = None
+
+    def enable(self):
+        world = self._scenario.c_world
+        # after a reconnect the server may still be synchronous, keep the
+        # settings from before the first enable()
+        if self._settings is None:
+            self._settings = world.get_settings()
+
+        settings = world.get_settings()
+        settings.synchronous_mode = True
+        settings.fixed_delta_seconds = self._fixed_delta
+        world.apply_settings(settings)
+        logger.info('synchronous mode on, fixed_delta {}'.format(self._fixed_delta))
+
+    def restore(self):
+        if self._settings is not None:
+            self._scenario.c_world.apply_settings(self._settings)
+            self._settings = None
+            logger.info('synchronous mode off')
+
+    def step(self):
+        world = self._scenario.c_world
+        world.tick(self._tick_timeout)
+        snapshot = world.get_snapshot()
+
+        self._in_flight.append(self._executor.submit(self._scenario.process_snapshot, snapshot))
+        while len(self._in_flight) > self._depth:
+            self._in_flight.popleft().result()
+
+        if self._wall_start is None:
+            self._wall_start = monotonic()
+            self._sim_start = snapshot.timestamp.elapsed_seconds
+        self._sim_time = snapshot.timestamp.elapsed_seconds
+        self.ticks += 1
+
+        if self._report_every and self.ticks % self._report_every == 0:
+            logger.info(self.stats())
+
+    def run(self, supervisor=None):
+        """
+            supervisor: ConnectionSupervisor the steps run through
+        """
+        if self._scenario.c_world is None:
+            self._scenario.get_client()
+
+        self.enable()
+        if supervisor is not None:
+            # in-flight ticks read the actor registry, which reconnect() rebinds
+            supervisor.before_reconnect(self._drain)
+            supervisor.on_reconnect(self.enable)
+        try:
+            while self._scenario.run:
+                if supervisor is None:
+                    self.step()
+                else:
+                    supervisor.call(self.step)
+        finally:
+            while self._in_flight:
+                self._in_flight.popleft().result()
+            self.restore()
+
+    def _drain(self):
+        # snapshots still in flight belong to the old connection
+        while self._in_flight:
+            try:
+                self._in_flight.popleft().result()
+            except RuntimeError as e:
+                logger.info('dropped in-flight tick : {}'.format(e))
+
+    def stats(self):
+        wall = monotonic() - self._wall_start if self._wall_start else 0.0
+        sim = self._sim_time - self._sim_start if self._sim_start is not None else 0.0
+        # in sync mode every tick advances fixed_delta, so the achieved rate
+        # shows as real_time_factor, simulated seconds per wall second
+        return {
+            'ticks': self.ticks,
+            'wall_fps': (self.ticks - 1) / wall if wall else 0.0,
+            'real_time_factor': sim / wall if wall else 0.0,
+            'in_flight': len(self._in_flight),
+        }
@@ -0,0 +1,54 @@
+"""
+    Carla Traffic Lights
+"""
+
+from loguru import logger
+
+from scenarios.actor_geometry import ActorBatch, footprints
+from scenarios.xviz_pipeline import ActorState
+
+STATE_CLASSES = {
+    'Red': 'red_state',
+    'Yellow': 'yellow_state',
+    'Green': 'green_state',
+}
+
+
+def trigger_areas(actors):
+    """
+        Trigger volume footprints of traffic lights or stop signs, {id: [x0, y0, z0, ... x3, y3, z3]}.
+    """
+    states = []
+    for actor in actors:
+        transform = actor.get_transform()
+        location, rotation = transform.location, transform.rotation
+        volume = actor.trigger_volume
+        states.append(ActorState(actor.id,
+                                 (location.x, location.y, location.z),
+                                 (rotation.roll, rotation.pitch, rotation.yaw),
+                                 (volume.location.x, volume.location.y, volume.location.z),
+                                 (volume.extent.x, volume.extent.y, volume.extent.z)))
+
+    batch = ActorBatch.from_states(states)
+    return dict(zip(batch.ids.tolist(), footprints(batch).reshape((len(batch), 12)).tolist()))
+
+
+class TrafficLightTracker:
+    """
+        Trigger areas are computed once, update() then only reports the
+        lights whose state changed since the previous call.
+    """
+    def __init__(self, world) -> None:
+        self._lights = {actor.id: actor for actor in world.get_actors().filter('traffic.traffic_light*')}
+        self.areas = trigger_areas(self._lights.values())
+        self.states = {}  # {id: style class}
+        logger.info('traffic lights {}'.format(len(self.areas)))
+
+    def update(self):
+        changed = {}
+        for id, actor in self._lights.items():
+            state = STATE_CLASSES.get(str(actor.state), 'unknown')
+            if self.states.get(id) != state:
+                self.states[id] = state
+                changed[id] = state
+        return changed
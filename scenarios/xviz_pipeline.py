@@ -0,0 +1,133 @@
+"""
+    Carla XVIZ Pipeline
+"""
+
+import threading
+from loguru import logger
+
+from scenarios.bounded_queue import BoundedQueue, DROP_OLDEST
+from scenarios.metrics import metrics
+
+
+class ActorState:
+    __slots__ = ('id', 'location', 'rotation', 'bbox_location', 'extent')
+
+    def __init__(self, id, location, rotation, bbox_location, extent) -> None:
+        self.id = id
+        self.location = location            # (x, y, z) in carla coordinates
+        self.rotation = rotation            # (roll, pitch, yaw) in degrees
+        self.bbox_location = bbox_location  # bounding box center, actor frame
+        self.extent = extent                # bounding box half size (x, y, z)
+
+
+class FrameSnapshot:
+    """
+        Plain python copy of what one XVIZ frame needs, so the writer thread
+        never touches carla objects.
+    """
+    __slots__ = ('frame', 'timestamp', 'ego', 'velocity', 'acceleration', 'vehicles', 'walkers',
+                 'lanes', 'stop_signs', 'traffic_lights')
+
+    def __init__(self, frame, timestamp, ego, velocity, acceleration, vehicles, walkers,
+                 lanes=(), stop_signs=(), traffic_lights=()) -> None:
+        self.frame = frame
+        self.timestamp = timestamp
+        self.ego = ego                    # ActorState or None
+        self.velocity = velocity          # m/s
+        self.acceleration = acceleration  # m/s^2
+        self.vehicles = vehicles          # ActorBatch
+        self.walkers = walkers            # ActorBatch
+        self.lanes = lanes                # [(N, 3) array] lane boundaries near the ego, y flipped
+        self.stop_signs = stop_signs      # [(x, y, z)] near the ego, y flipped
+        self.traffic_lights = traffic_lights  # [(polygon, style class)] near the ego
+
+
+def actor_state(info, actor_snapshot):
+    """
+        info: ActorInfo from the ActorRegistry, only the transform is read
+        from the snapshot.
+    """
+    transform = actor_snapshot.get_transform()
+    location, rotation = transform.location, transform.rotation
+    return ActorState(info.id,
+                      (location.x, location.y, location.z),
+                      (rotation.roll, rotation.pitch, rotation.yaw),
+                      info.bbox_location,
+                      info.extent)
+
+
+class XVIZFramePipeline:
+    """
+        Turns FrameSnapshots into XVIZ state updates on a dedicated thread and
+        writes them through an XVIZ writer (GLB or JSON), so serialization
+        never runs on the wait_for_tick loop.
+
+        batch_size: snapshots drained and written per writer wake-up
+    """
+    def __init__(self, xviz, writer, batch_size=10, max_pending=64, policy=DROP_OLDEST) -> None:
+        self._xviz = xviz
+        self._writer = writer
+        self._batch_size = batch_size
+        self._pending = BoundedQueue(max_pending, policy)
+        self._latest_lock = threading.Lock()
+        self._points = {}  # {stream: (N, 3) array}, latest cloud not yet written
+        self._images = {}  # {sensor_id: (encoded bytes, width, height)}, latest image not yet written
+
+        self.written = 0
+        self.errors = 0
+
+        self._writer.write_message(self._xviz.get_metabuilder().get_message())
+
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, snapshot):
+        self._pending.put(snapshot)
+        metrics.stage('world', snapshot.frame, 'enqueue')
+
+    def update_points(self, stream, points):
+        with self._latest_lock:
+            self._points[stream] = points
+
+    def update_image(self, sensor_id, data, width, height):
+        with self._latest_lock:
+            self._images[sensor_id] = (data, width, height)
+
+    def _take_latest(self):
+        with self._latest_lock:
+            points, self._points = self._points, {}
+            images, self._images = self._images, {}
+        return points, images
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'errors': self.errors,
+            'pending': self._pending.stats(),
+        }
+
+    def close(self):
+        self._pending.put_sentinel()
+        self._thread.join()
+        self._writer.close()
+        logger.info('xviz pipeline closed {}'.format(self.stats()))
+
+    def _write_loop(self):
+        running = True
+        while running:
+            batch = [self._pending.get()]
+            while len(batch) < self._batch_size and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+
+            for snapshot in batch:
+                if snapshot is None:
+                    running = False
+                    break
+                try:
+                    metrics.stage('world', snapshot.frame, 'dequeue')
+                    self._writer.write_message(self._xviz.get_frame_message(snapshot, *self._take_latest()))
+                    self.written += 1
+                    metrics.stage('world', snapshot.frame, 'output', done=True)
+                except Exception as e:
+                    self.errors += 1
+                    logger.info('xviz frame {} failed : {}'.format(snapshot.frame, e))
@@ -0,0 +1,190 @@
+"""
+    Carla XVIZ Live Server
+"""
+
+import io
+import asyncio
+import threading
+from collections import deque
+import websockets
+from websockets.exceptions import ConnectionClosed
+from loguru import logger
+
+
+class _Client:
+    __slots__ = ('address', 'metadata', 'frames', 'ready', 'sent', 'skipped')
+
+    def __init__(self, address, metadata, max_buffered) -> None:
+        self.address = address
+        self.metadata = metadata                  # sent before any frame, None once sent
+        self.frames = deque(maxlen=max_buffered)  # GLB frames not sent yet, oldest drop first
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.skipped = 0
+
+
+class _BroadcastFile(io.BytesIO):
+    def __init__(self, source, name) -> None:
+        super().__init__()
+        self._source = source
+        self._name = name
+
+    def close(self):
+        if not self.closed:
+            self._source.write(self.getvalue(), self._name)
+        super().close()
+
+
+class BroadcastSource:
+    """
+        xviz_avs source that hands every GLB message the writer produces to
+        the XVIZStreamServer and, if given, to `sink` as well, so a frame
+        is serialized once for disk and all viewers.
+    """
+    def __init__(self, server, sink=None) -> None:
+        self._server = server
+        self._sink = sink
+
+    def open(self, name, mode='w'):
+        return _BroadcastFile(self, name)
+
+    def write(self, data, name):
+        if name == '1-frame.glb':
+            self._server.publish_metadata(data)
+        elif name.endswith('.glb'):
+            self._server.publish(data)
+        if self._sink is not None:
+            self._sink.write(data, name)
+
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+
+
+class XVIZStreamServer:
+    """
+        WebSocket server streaming live XVIZ to streetscape.gl clients.
+
+        Runs its own asyncio loop on a daemon thread. Every client gets the
+        metadata first, then frames from a send buffer of `max_buffered`
+        entries: when a client falls behind its oldest frames are skipped,
+        publish() never waits on a socket.
+    """
+    def __init__(self, port=3000, host='0.0.0.0', max_buffered=2) -> None:
+        self._host = host
+        self._port = port
+        self._max_buffered = max_buffered
+        self._clients = set()
+        self._metadata = None
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+        self.published = 0
+        self.connections = 0
+        self.sent = 0
+        self.skipped = 0
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            raise RuntimeError('xviz live server failed to listen on {}:{}'.format(self._host, self._port))
+        logger.info('xviz live on ws://{}:{}'.format(self._host, self._port))
+        return self
+
+    def source(self, sink=None):
+        return BroadcastSource(self, sink)
+
+    def publish_metadata(self, data):
+        self._loop.call_soon_threadsafe(self._fan_out_metadata, data)
+
+    def publish(self, data):
+        self.published += 1
+        self._loop.call_soon_threadsafe(self._fan_out, data)
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'connections': self.connections,
+            'clients': len(self._clients),
+            'sent': self.sent,
+            'skipped': self.skipped,
+        }
+
+    def close(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        logger.info('xviz live closed {}'.format(self.stats()))
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(self._serve())
+        finally:
+            self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _serve(self):
+        # GLB frames are mostly float arrays, deflate costs more than it saves
+        return await websockets.serve(self._handle, self._host, self._port, compression=None)
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _fan_out_metadata(self, data):
+        self._metadata = data
+        for client in self._clients:
+            client.metadata = data
+            client.frames.clear()
+            client.ready.set()
+
+    def _fan_out(self, data):
+        if self._metadata is None:
+            return
+        for client in self._clients:
+            if len(client.frames) == client.frames.maxlen:
+                client.skipped += 1
+                self.skipped += 1
+            client.frames.append(data)
+            client.ready.set()
+
+    async def _handle(self, connection, path=None):
+        client = _Client(connection.remote_address, self._metadata, self._max_buffered)
+        self._clients.add(client)
+        self.connections += 1
+        if client.metadata is not None:
+            client.ready.set()
+        logger.info('xviz live client {} connected'.format(client.address))
+
+        # the sender idles on client.ready, closing is noticed here
+        sender = asyncio.ensure_future(self._send(connection, client))
+        try:
+            await connection.wait_closed()
+        finally:
+            sender.cancel()
+            self._clients.discard(client)
+            logger.info('xviz live client {} left : {} sent, {} skipped'.format(
+                client.address, client.sent, client.skipped))
+
+    async def _send(self, connection, client):
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                if client.metadata is not None:
+                    metadata, client.metadata = client.metadata, None
+                    await connection.send(metadata)
+                while client.frames and client.metadata is None:
+                    await connection.send(client.frames.popleft())
+                    client.sent += 1
+                    self.sent += 1
+        except ConnectionClosed:
+            pass